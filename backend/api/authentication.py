@@ -0,0 +1,47 @@
+import copy
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import LocalTTLCache, bump_versions, get_versions
+
+TOKEN = 'auth:token:{}'
+USER = 'auth:user:{}'
+
+token_cache = LocalTTLCache(
+    settings.AUTH_TOKEN_CACHE_SIZE,
+    settings.AUTH_TOKEN_CACHE_TTL
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешем token -> user в памяти процесса.
+
+    Вместе с записью хранятся версии токена и пользователя из общего
+    кеша, и на каждом попадании они сверяются одним get_many. Выход,
+    смена пароля и любое сохранение пользователя меняют версию, поэтому
+    все воркеры сразу перестают принимать отозванный токен.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            versions, user, token = cached
+            current = get_versions(TOKEN.format(key), USER.format(user.pk))
+            if current == versions:
+                return copy.copy(user), token
+        user, token = super().authenticate_credentials(key)
+        versions = get_versions(TOKEN.format(key), USER.format(user.pk))
+        token_cache.set(key, (versions, user, token))
+        return copy.copy(user), token
+
+
+def invalidate_token(key):
+    token_cache.delete(key)
+    transaction.on_commit(lambda: bump_versions(TOKEN.format(key)))
+
+
+def invalidate_user_tokens(user_id):
+    token_cache.delete_where(lambda cached: cached[1].pk == user_id)
+    transaction.on_commit(lambda: bump_versions(USER.format(user_id)))
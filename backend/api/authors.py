@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from users.models import Subscriptions, User
+
+from .cache import LocalTTLCache, get_versions
+
+AUTHOR = 'users:author:{}'
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+
+author_cache = LocalTTLCache(
+    settings.AUTHOR_CACHE_SIZE,
+    settings.AUTHOR_CACHE_TTL
+)
+
+
+def get_authors(ids):
+    """Не зависящая от зрителя часть данных авторов по id.
+
+    Порядок поиска: кеш процесса, общий кеш, база. Записи обоих
+    уровней привязаны к версии автора, которую сбрасывает сохранение
+    пользователя, поэтому версии всех авторов страницы сверяются
+    одним get_many.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    versions = dict(zip(ids, get_versions(
+        *(AUTHOR.format(pk) for pk in ids)
+    )))
+    authors = {}
+    for pk in ids:
+        entry = author_cache.get(pk)
+        if entry is not None and entry[0] == versions[pk]:
+            authors[pk] = entry[1]
+    keys = {
+        f'{AUTHOR.format(pk)}:{versions[pk]}': pk
+        for pk in ids if pk not in authors
+    }
+    if keys:
+        shared = {
+            keys[key]: payload
+            for key, payload in cache.get_many(list(keys)).items()
+        }
+        missing = [pk for pk in keys.values() if pk not in shared]
+        if missing:
+            loaded = {
+                row['id']: row
+                for row in User.objects.filter(
+                    pk__in=missing
+                ).values(*AUTHOR_FIELDS)
+            }
+            cache.set_many(
+                {
+                    f'{AUTHOR.format(pk)}:{versions[pk]}': payload
+                    for pk, payload in loaded.items()
+                },
+                settings.CACHE_TIMEOUT
+            )
+            shared.update(loaded)
+        for pk, payload in shared.items():
+            author_cache.set(pk, (versions[pk], payload))
+            authors[pk] = payload
+    return authors
+
+
+def get_subscribed(user, author_ids):
+    """id авторов, на которых подписан user, одним запросом."""
+    if not user.is_authenticated or not author_ids:
+        return set()
+    return set(Subscriptions.objects.filter(
+        user=user,
+        author_id__in=set(author_ids)
+    ).values_list('author_id', flat=True))
@@ -0,0 +1,133 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'version:{}'
+LOCK_KEY = 'lock:{}'
+
+
+def new_version():
+    return int(time.time() * 1000000)
+
+
+def get_versions(*names):
+    """Текущие версии пространств ключей, недостающие создаются."""
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            if not cache.add(key, version, None):
+                missing[key] = cache.get(key, version)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*names):
+    """Делает недействительными все ключи с этими версиями."""
+    version = new_version()
+    cache.set_many(
+        {VERSION_KEY.format(name): version for name in names}, None
+    )
+
+
+def make_key(prefix, *parts):
+    digest = hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return f'{prefix}:{digest}'
+
+
+def get_or_compute(key, compute, timeout=None, stale_timeout=None):
+    """Значение из кеша с защитой от одновременного пересчёта.
+
+    Пересчитывает значение только один процесс, владеющий блокировкой.
+    Остальные в течение stale_timeout после истечения timeout получают
+    устаревшее значение, а при пустом кеше ждут результат до
+    CACHE_LOCK_TIMEOUT секунд.
+    """
+    if timeout is None:
+        timeout = settings.CACHE_TIMEOUT
+    if stale_timeout is None:
+        stale_timeout = settings.CACHE_STALE_TIMEOUT
+    entry = cache.get(key)
+    if entry is not None:
+        fresh_until, value = entry
+        if time.time() < fresh_until or not _acquire(key):
+            return value
+        return _recompute(key, compute, timeout, stale_timeout)
+    if _acquire(key):
+        return _recompute(key, compute, timeout, stale_timeout)
+    deadline = time.time() + settings.CACHE_LOCK_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(settings.CACHE_LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+    return compute()
+
+
+def _acquire(key):
+    return cache.add(LOCK_KEY.format(key), 1, settings.CACHE_LOCK_TIMEOUT)
+
+
+def _recompute(key, compute, timeout, stale_timeout):
+    try:
+        value = compute()
+        cache.set(
+            key,
+            (time.time() + timeout, value),
+            timeout + stale_timeout
+        )
+    finally:
+        cache.delete(LOCK_KEY.format(key))
+    return value
+
+
+class LocalTTLCache:
+    """Ограниченный по размеру LRU-кеш процесса со временем жизни записей."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        with self._lock:
+            for key in [
+                key for key, (_, value) in self._data.items()
+                if predicate(value)
+            ]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,77 @@
+import base64
+import binascii
+import heapq
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from recipes.models import Recipes, RecipeTombstone
+
+
+def encode_cursor(at, pk):
+    return base64.urlsafe_b64encode(
+        f'{at.isoformat()}|{pk}'.encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    """Курсор -> (время, id); ValueError, если курсор испорчен."""
+    try:
+        at, pk = base64.urlsafe_b64decode(
+            cursor.encode()
+        ).decode().split('|')
+        at, pk = parse_datetime(at), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError(cursor)
+    if at is None:
+        raise ValueError(cursor)
+    return at, pk
+
+
+def after(field, pk_field, at, pk):
+    return Q(**{f'{field}__gt': at}) | Q(**{field: at, f'{pk_field}__gt': pk})
+
+
+def recipe_changes(since, limit):
+    """Изменения рецептов после курсора since по возрастанию (время, id).
+
+    Читаются два диапазона по индексам: рецепты по (updated_at, id)
+    и удаления по (deleted_at, recipe_id). Последние
+    CHANGES_SETTLE_SECONDS секунд не отдаются, чтобы транзакции,
+    закоммиченные позже своего updated_at, не оказались за курсором.
+    Без since отдаются только существующие рецепты.
+    Возвращает кортежи (время, id, тип) и признак продолжения.
+    """
+    until = timezone.now() - timedelta(
+        seconds=settings.CHANGES_SETTLE_SECONDS
+    )
+    recipes = Recipes.objects.filter(updated_at__lte=until)
+    streams = []
+    created_after = since and since[0]
+    if since is not None:
+        recipes = recipes.filter(after('updated_at', 'id', *since))
+        streams.append(
+            (deleted_at, recipe_id, 'deleted')
+            for recipe_id, deleted_at in RecipeTombstone.objects.filter(
+                after('deleted_at', 'recipe_id', *since),
+                deleted_at__lte=until
+            ).order_by('deleted_at', 'recipe_id').values_list(
+                'recipe_id', 'deleted_at'
+            )[:limit + 1]
+        )
+    streams.append(
+        (
+            updated_at,
+            pk,
+            'created' if created_after is None or pub_date > created_after
+            else 'updated'
+        )
+        for pk, pub_date, updated_at in recipes.order_by(
+            'updated_at', 'id'
+        ).values_list('id', 'pub_date', 'updated_at')[:limit + 1]
+    )
+    changes = list(islice(heapq.merge(*streams), limit + 1))
+    return changes[:limit], len(changes) > limit
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs=None, **kwargs):
+    """Предупреждает, если в бою кеш свой у каждого процесса."""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or not backend.endswith('LocMemCache'):
+        return []
+    return [Warning(
+        f'Кеш {backend} свой у каждого процесса: версии ключей, снимки и '
+        'отзыв токенов не доходят до других воркеров.',
+        hint='Задайте CACHE_BACKEND и CACHE_LOCATION общего кеша.',
+        id='api.W001',
+    )]
@@ -1,14 +1,17 @@
+from django.db.models import Exists, OuterRef
 from django_filters import FilterSet
 from django_filters import rest_framework as filters
-from recipes.models import Ingredients, Recipes, Tags
+from recipes.models import CountIngredients, Recipes, Tags
 
+ORDERINGS = {
+    'newest': ('-pub_date', '-id'),
+    'fastest': ('cooking_time', '-id'),
+    'popular': ('-favorites_count', '-id'),
+}
 
-class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='startswith')
 
-    class Meta:
-        model = Ingredients
-        fields = ['name']
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class CustomRecipesFilter(FilterSet):
@@ -28,8 +31,32 @@ class CustomRecipesFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tags.objects.all(),
+        method='tags_filter',
         label='Поиск по тегу'
     )
+    cooking_time_min = filters.NumberFilter(
+        field_name='cooking_time',
+        lookup_expr='gte',
+        label='Время приготовления не меньше'
+    )
+    cooking_time_max = filters.NumberFilter(
+        field_name='cooking_time',
+        lookup_expr='lte',
+        label='Время приготовления не больше'
+    )
+    ingredients = NumberInFilter(
+        method='ingredients_filter',
+        label='Все эти ингредиенты'
+    )
+    exclude_ingredients = NumberInFilter(
+        method='exclude_ingredients_filter',
+        label='Без этих ингредиентов'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='ordering_filter',
+        label='Сортировка'
+    )
 
     def favorited_filter(self, queryset, name, value):
         user = self.request.user
@@ -43,11 +70,48 @@ class CustomRecipesFilter(FilterSet):
             return queryset.filter(shopping_recipe__user=user)
         return queryset
 
+    def ingredients_filter(self, queryset, name, value):
+        for position, pk in enumerate(sorted({int(pk) for pk in value})):
+            alias = f'has_ingredient_{position}'
+            queryset = queryset.annotate(**{
+                alias: Exists(CountIngredients.objects.filter(
+                    recipe=OuterRef('pk'),
+                    ingredients_id=pk
+                ))
+            }).filter(**{alias: True})
+        return queryset
+
+    def exclude_ingredients_filter(self, queryset, name, value):
+        return queryset.annotate(
+            has_excluded_ingredient=Exists(CountIngredients.objects.filter(
+                recipe=OuterRef('pk'),
+                ingredients_id__in=[int(pk) for pk in value]
+            ))
+        ).filter(has_excluded_ingredient=False)
+
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.annotate(
+            has_tag=Exists(Recipes.tags.through.objects.filter(
+                recipes_id=OuterRef('pk'),
+                tags__in=value
+            ))
+        ).filter(has_tag=True)
+
+    def ordering_filter(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
+
     class Meta:
         model = Recipes
         fields = (
             'is_favorited',
             'author',
             'is_in_shopping_cart',
-            'tags'
+            'tags',
+            'cooking_time_min',
+            'cooking_time_max',
+            'ingredients',
+            'exclude_ingredients',
+            'ordering'
         )
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Число запросов в секунду к URL: сравнение ответа backend '
+        'напрямую и через микрокеш nginx'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--header',
+            action='append',
+            default=[],
+            help='Заголовок запроса в виде "Имя: значение"'
+        )
+
+    def handle(self, *args, **options):
+        headers = {}
+        for header in options['header']:
+            name, value = header.split(':', 1)
+            headers[name.strip()] = value.strip()
+        for url in options['urls']:
+            self.run(url, headers, options['requests'],
+                     options['concurrency'])
+
+    def run(self, url, headers, total, concurrency):
+        def fetch(_):
+            start = time.perf_counter()
+            with urlopen(Request(url, headers=headers)) as response:
+                response.read()
+                status = response.headers.get('X-Cache-Status', '-')
+            return time.perf_counter() - start, status
+
+        fetch(None)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(fetch, range(total)))
+        elapsed = time.perf_counter() - start
+        latencies = sorted(latency for latency, _ in results)
+        statuses = {}
+        for _, status in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        self.stdout.write(
+            f'{url}: {total / elapsed:.0f} запросов/с, '
+            f'p50 {latencies[len(latencies) // 2] * 1000:.1f} мс, '
+            f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс, '
+            f'X-Cache-Status {statuses}'
+        )
@@ -0,0 +1,72 @@
+import time
+import uuid
+
+from api.throttling import IPActionThrottle, UserActionThrottle, parse_rate
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.settings import api_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from users.models import User
+
+
+class ThrottledView(APIView):
+    action = 'favorite'
+    throttle_scopes = {'favorite': 'favorite'}
+
+
+class Command(BaseCommand):
+    help = 'Замер накладных расходов ограничения частоты на запрос'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        user = User(pk=0, username='benchmark')
+        factory = APIRequestFactory()
+        view = ThrottledView()
+        django_request = factory.post('/')
+        force_authenticate(django_request, user)
+        request = view.initialize_request(django_request)
+        # Настроенный кеш приложения; ключи замера уникальны и удаляются
+        # после прогона, остальной кеш не трогаем.
+        token = uuid.uuid4().hex
+        keys = []
+        for throttle_class in (UserActionThrottle, IPActionThrottle):
+            benchmark_class = type(
+                throttle_class.__name__, (throttle_class,),
+                {'get_ident_key': lambda self, request: self.ident}
+            )
+            started = time.time()
+            run = 0
+            total = 0
+            for i in range(iterations):
+                throttle = benchmark_class()
+                throttle.ident = f'benchmark-{token}-{run}'
+                start = time.perf_counter()
+                allowed = throttle.allow_request(request, view)
+                total += time.perf_counter() - start
+                if not allowed:
+                    run += 1
+            keys.extend(
+                self.window_keys(benchmark_class, token, run, started)
+            )
+            self.stdout.write(
+                f'{throttle_class.__name__}: '
+                f'{total / iterations * 1000000:.1f} мкс на запрос'
+            )
+        cache.delete_many(keys)
+
+    def window_keys(self, throttle_class, token, runs, started):
+        """Ключи счётчиков всех идентификаторов замера за время прогона."""
+        scope = f'{ThrottledView.action}_{throttle_class.suffix}'
+        _, duration = parse_rate(api_settings.DEFAULT_THROTTLE_RATES[scope])
+        windows = range(
+            int(started // duration), int(time.time() // duration) + 1
+        )
+        return [
+            f'throttle:{scope}:benchmark-{token}-{run}:{window}'
+            for run in range(runs + 1)
+            for window in windows
+        ]
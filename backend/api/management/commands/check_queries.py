@@ -0,0 +1,179 @@
+import difflib
+import json
+import os
+
+from api.querycount import record_queries
+from api.snapshots import ingredient_snapshot
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from recipes.models import (CountIngredients, FavoriteRecipes, Ingredients,
+                            Recipes, ShoppingCart, Tags)
+from recipes.similarity import rebuild_all
+from rest_framework.test import APIClient
+from users.models import Subscriptions, User
+
+SNAPSHOT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'query_snapshots'
+)
+SIZES = (2, 6)
+ENDPOINTS = (
+    ('recipes_list_anonymous', False, '/api/recipes/?limit={size}'),
+    ('recipes_list', True, '/api/recipes/?limit={size}'),
+    (
+        'recipes_list_filtered',
+        True,
+        '/api/recipes/?limit={size}&is_favorited=1&is_in_shopping_cart=1'
+        '&tags=tag0&tags=tag1'
+    ),
+    (
+        'recipes_list_sorted',
+        True,
+        '/api/recipes/?limit={size}&ordering=popular&cooking_time_max=1000'
+        '&exclude_ingredients=0'
+    ),
+    ('recipe_detail', True, '/api/recipes/{recipe}/'),
+    ('recipe_detail_anonymous', False, '/api/recipes/{recipe}/'),
+    ('recipe_similar', False, '/api/recipes/{recipe}/similar/'),
+    ('recipes_bulk', True, '/api/recipes/bulk/?ids={ids}'),
+    ('recipe_changes', False, '/api/recipes/changes/'),
+    ('ingredients_list', False, '/api/ingredients/?name=ingredient'),
+    ('tags_list', False, '/api/tags/'),
+    ('users_list', True, '/api/users/?limit={size}'),
+    ('subscriptions', True, '/api/users/subscriptions/?limit={size}'),
+    ('download_shopping_cart', True, '/api/recipes/download_shopping_cart/'),
+)
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка числа и формы SQL-запросов API на двух размерах данных '
+        'и сверка со снимками в query_snapshots'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Перезаписать снимок текущими запросами'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(CACHES=NO_CACHE):
+                runs = [self.measure(size) for size in SIZES]
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        errors = [
+            f'{name}: {len(runs[0][name])} -> {len(runs[-1][name])} '
+            f'запросов при росте данных {SIZES[0]} -> {SIZES[-1]}'
+            for name in runs[0]
+            if len(runs[-1][name]) > len(runs[0][name])
+        ]
+        snapshot = {
+            name: {'queries': len(queries), 'sql': queries}
+            for name, queries in runs[-1].items()
+        }
+        path = os.path.join(SNAPSHOT_DIR, f'{connection.vendor}.json')
+        if options['update']:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as snapshot_file:
+                json.dump(snapshot, snapshot_file, indent=2)
+                snapshot_file.write('\n')
+        elif os.path.exists(path):
+            with open(path, encoding='utf-8') as snapshot_file:
+                errors.extend(self.compare(json.load(snapshot_file), snapshot))
+        else:
+            errors.append(f'Нет снимка {path}, запустите с --update')
+        for name, queries in snapshot.items():
+            self.stdout.write(f'{name}: {queries["queries"]}')
+        if errors:
+            raise CommandError('\n'.join(errors))
+
+    def compare(self, expected, actual):
+        errors = []
+        for name in sorted(expected.keys() | actual.keys()):
+            old = expected.get(name, {}).get('sql', [])
+            new = actual.get(name, {}).get('sql', [])
+            if old != new:
+                diff = '\n'.join(difflib.unified_diff(
+                    old, new, 'snapshot', 'current', lineterm=''
+                ))
+                errors.append(f'{name}: запросы изменились\n{diff}')
+        return errors
+
+    def measure(self, size):
+        with transaction.atomic():
+            viewer, recipe = self.seed(size)
+            ingredient_snapshot.refresh()
+            rebuild_all()
+            ids = ','.join(
+                str(pk) for pk in Recipes.objects.values_list('pk', flat=True)
+            )
+            anonymous = APIClient()
+            client = APIClient()
+            client.force_authenticate(viewer)
+            results = {
+                name: record_queries(
+                    client if authenticated else anonymous,
+                    'get',
+                    url.format(size=size, recipe=recipe.pk, ids=ids)
+                )
+                for name, authenticated, url in ENDPOINTS
+            }
+            transaction.set_rollback(True)
+        return results
+
+    def seed(self, size):
+        viewer = User.objects.create_user(
+            username='viewer',
+            email='viewer@example.com',
+            password='viewer-password'
+        )
+        tags = [
+            Tags.objects.create(
+                name=f'tag{i}',
+                color='#FFFFFF',
+                slug=f'tag{i}'
+            )
+            for i in range(3)
+        ]
+        ingredients = Ingredients.objects.bulk_create([
+            Ingredients(name=f'ingredient {i}', measurement_unit='g')
+            for i in range(size * 3)
+        ])
+        ingredients = list(Ingredients.objects.all())
+        for i in range(size):
+            author = User.objects.create(
+                username=f'author{i}',
+                email=f'author{i}@example.com'
+            )
+            recipe = Recipes.objects.create(
+                author=author,
+                name=f'recipe {i}',
+                text='text',
+                cooking_time=i + 1,
+                image='recipes/test.png'
+            )
+            recipe.tags.set(tags)
+            CountIngredients.objects.bulk_create(
+                CountIngredients(
+                    recipe=recipe,
+                    ingredients=ingredient,
+                    amount=1
+                )
+                for ingredient in ingredients[i * 3:i * 3 + 3]
+            )
+            FavoriteRecipes.objects.create(user=viewer, recipe=recipe)
+            ShoppingCart.objects.create(user=viewer, recipe=recipe)
+            Subscriptions.objects.create(user=viewer, author=author)
+        return viewer, recipe
@@ -0,0 +1,130 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+RE_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+TARGETS = {
+    'setup': 'import django; django.setup()',
+    'wsgi': 'from backend.wsgi import application',
+    'urls': (
+        'from backend.wsgi import application; '
+        'from django.urls import get_resolver; get_resolver().url_patterns'
+    ),
+}
+
+
+class Module:
+    def __init__(self, name, own, total):
+        self.name = name
+        self.own = own
+        self.total = total
+        self.children = []
+
+
+def parse(output):
+    """Дерево импортов из вывода -X importtime.
+
+    Python печатает модуль после всех его вложенных импортов, поэтому
+    дети копятся по уровням, пока не встретится их родитель.
+    """
+    pending = {}
+    for line in output.splitlines():
+        match = RE_IMPORT_TIME.match(line)
+        if match is None:
+            continue
+        own, total, indent, name = match.groups()
+        level = len(indent) // 2
+        module = Module(name, int(own) / 1000, int(total) / 1000)
+        module.children = pending.pop(level + 1, [])
+        pending.setdefault(level, []).append(module)
+    return pending.get(0, [])
+
+
+def walk(modules, level=0):
+    for module in modules:
+        yield level, module
+        yield from walk(module.children, level + 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Время импорта модулей при холодном старте: запускает новый '
+        'интерпретатор с -X importtime и печатает дерево импортов'
+    )
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            choices=TARGETS,
+            default='urls',
+            help='setup: django.setup(); wsgi: приложение WSGI; '
+                 'urls: WSGI и загрузка URLconf, как при первом запросе'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Число запусков, берётся самый быстрый'
+        )
+        parser.add_argument(
+            '--min-ms',
+            type=float,
+            default=5,
+            help='Не показывать модули с меньшим суммарным временем'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=20,
+            help='Сколько модулей показать в списке по собственному времени'
+        )
+
+    def handle(self, *args, **options):
+        runs = [self.run(TARGETS[options['target']])
+                for _ in range(options['repeat'])]
+        elapsed, roots = min(runs, key=lambda run: run[0])
+        imported = sum(root.total for root in roots)
+        self.stdout.write(
+            f'{options["target"]}: {elapsed * 1000:.0f} мс всего, '
+            f'{imported:.0f} мс на импорты'
+        )
+        for level, module in walk(roots):
+            if module.total >= options['min_ms']:
+                self.stdout.write(
+                    f'{module.total:8.1f} {module.own:8.1f}  '
+                    f'{"  " * level}{module.name}'
+                )
+        self.stdout.write('\nСобственное время, мс:')
+        modules = sorted(
+            (module for _, module in walk(roots)),
+            key=lambda module: module.own,
+            reverse=True
+        )
+        for module in modules[:options['top']]:
+            self.stdout.write(f'{module.own:8.1f}  {module.name}')
+
+    def run(self, code):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'backend.settings'
+            )
+        )
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stderr=subprocess.PIPE,
+            universal_newlines=True
+        )
+        elapsed = time.perf_counter() - start
+        if process.returncode:
+            raise CommandError(process.stderr[-2000:])
+        return elapsed, parse(process.stderr)
@@ -0,0 +1,259 @@
+import gzip
+import json
+import logging
+import os
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connection, transaction
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .sqlstats import fingerprint, sql_stats
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger('api.sql')
+
+RE_ACCEPT_BR = re.compile(r'\bbr\b')
+RE_ACCEPT_GZIP = re.compile(r'\bgzip\b')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжатие ответов: brotli, если модуль установлен, иначе gzip.
+
+    Ответы меньше COMPRESSION_MIN_SIZE байт отдаются как есть.
+    ETag после сжатия становится слабым, чтобы ConditionalGetMiddleware
+    отвечал 304 независимо от выбранного кодирования.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if (brotli is not None and settings.COMPRESSION_BROTLI
+                and RE_ACCEPT_BR.search(accept)):
+            encoding = 'br'
+            content = brotli.compress(
+                response.content,
+                quality=settings.COMPRESSION_BROTLI_QUALITY
+            )
+        elif RE_ACCEPT_GZIP.search(accept):
+            encoding = 'gzip'
+            content = gzip.compress(
+                response.content,
+                compresslevel=settings.COMPRESSION_GZIP_LEVEL,
+                mtime=0
+            )
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class SQLRecorder:
+    """Обёртка execute: запоминает каждый SQL-запрос и его время.
+
+    Что именно хранить, решает record, его переопределяют наследники.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(
+                sql, params, many, (time.perf_counter() - start) * 1000
+            )
+
+    def record(self, sql, params, many, time_ms):
+        self.queries.append({
+            'sql': sql,
+            'params': repr(params)[:500],
+            'time_ms': round(time_ms, 3),
+        })
+
+
+class ProfilingMiddleware:
+    """Профилирование отдельных запросов сотрудников.
+
+    Включается заголовком X-Profile или параметром _profile. Значение
+    inline возвращает отчёт вместо тела ответа, любое другое сохраняет
+    .prof и .json в PROFILING_DIR и отдаёт имя в заголовке X-Profile-Id.
+    При PROFILING_ENABLED = False middleware не подключается совсем.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = (
+            request.META.get('HTTP_X_PROFILE')
+            or request.GET.get('_profile')
+        )
+        if not mode or not self.is_staff(request):
+            return self.get_response(request)
+        import cProfile
+
+        profiler = cProfile.Profile()
+        recorder = SQLRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        report = self.report(request, profiler, recorder, start)
+        if mode == 'inline':
+            return JsonResponse(
+                {'status': response.status_code, 'profile': report},
+                json_dumps_params={'ensure_ascii': False}
+            )
+        response['X-Profile-Id'] = self.save(profiler, report)
+        return response
+
+    def is_staff(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        drf_request = Request(request)
+        for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                result = authenticator().authenticate(drf_request)
+            except AuthenticationFailed:
+                return False
+            if result is not None:
+                return result[0].is_staff
+        return False
+
+    def report(self, request, profiler, recorder, start):
+        import pstats
+
+        stats = pstats.Stats(profiler)
+        stats.sort_stats('cumulative')
+        functions = []
+        for func in stats.fcn_list[:settings.PROFILING_TOP_FUNCTIONS]:
+            calls, _, own_time, total_time, _ = stats.stats[func]
+            filename, line, name = func
+            functions.append({
+                'function': f'{filename}:{line}({name})',
+                'calls': calls,
+                'own_ms': round(own_time * 1000, 3),
+                'total_ms': round(total_time * 1000, 3),
+            })
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'total_ms': round((time.perf_counter() - start) * 1000, 3),
+            'sql_ms': round(
+                sum(query['time_ms'] for query in recorder.queries), 3
+            ),
+            'sql_count': len(recorder.queries),
+            'functions': functions,
+            'sql': recorder.queries,
+        }
+
+    def save(self, profiler, report):
+        profile_id = '{}-{}'.format(
+            time.strftime('%Y%m%d-%H%M%S'),
+            uuid.uuid4().hex[:8]
+        )
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILING_DIR, profile_id)
+        profiler.dump_stats(path + '.prof')
+        with open(path + '.json', 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, ensure_ascii=False, indent=2)
+        return profile_id
+
+
+class SQLStatsRecorder(SQLRecorder):
+    """Время каждого запроса без параметров и параметры медленных."""
+
+    def __init__(self, slow_ms):
+        super().__init__()
+        self.slow_ms = slow_ms
+        self.slow = []
+
+    def record(self, sql, params, many, time_ms):
+        self.queries.append((sql, time_ms))
+        if time_ms >= self.slow_ms and not many:
+            self.slow.append((sql, params, time_ms))
+
+
+class SQLStatsMiddleware:
+    """Статистика SQL по формам запросов и view, журнал медленных запросов.
+
+    Формы и время копятся в api.sqlstats.sql_stats и раз в
+    SQL_STATS_DUMP_INTERVAL секунд дописываются в SQL_STATS_LOG.
+    Запросы дольше SQL_SLOW_MS пишутся в логгер api.sql вместе с планом
+    EXPLAIN. При SQL_STATS_ENABLED = False middleware не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_STATS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SQLStatsRecorder(settings.SQL_SLOW_MS)
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = '{} {}'.format(
+            request.method, match.view_name if match else request.path
+        )
+        sql_stats.add(view, [
+            (fingerprint(sql), time_ms) for sql, time_ms in recorder.queries
+        ])
+        for sql, params, time_ms in recorder.slow[:settings.SQL_SLOW_EXPLAIN]:
+            self.log_slow(view, sql, params, time_ms)
+        if sql_stats.dump_due(settings.SQL_STATS_DUMP_INTERVAL):
+            sql_stats.dump(settings.SQL_STATS_LOG)
+        return response
+
+    def log_slow(self, view, sql, params, time_ms):
+        logger.warning(json.dumps({
+            'view': view,
+            'time_ms': round(time_ms, 3),
+            'sql': sql,
+            'params': repr(params)[:500],
+            'plan': self.explain(sql, params),
+        }, ensure_ascii=False))
+
+    def explain(self, sql, params):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return None
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'{connection.ops.explain_query_prefix()} {sql}', params
+                )
+                return [str(row[-1]) for row in cursor.fetchall()]
+        except DatabaseError as error:
+            return [f'EXPLAIN не выполнен: {error}']
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class SnapshotVersion(models.Model):
+    """Поколение данных снимка в памяти процессов (api.snapshots)."""
+    name = models.CharField('Снимок', max_length=100, primary_key=True)
+    version = models.BigIntegerField('Поколение', default=0)
+
+    class Meta:
+        verbose_name = 'Версия снимка'
+        verbose_name_plural = 'Версии снимков'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
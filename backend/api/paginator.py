@@ -1,6 +1,36 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from recipes.paginator import EstimatedCountPaginator
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class CustomPaginator(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class EstimatedPaginator(CustomPaginator):
+    """Постраничный вывод с приблизительным count на больших выборках.
+
+    Флаг count_estimated сообщает клиенту, что count — оценка
+    планировщика, а не точное число.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_estimated', self.page.paginator.estimated),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+class KeysetPaginator(CursorPagination):
+    """Постраничный вывод по курсору без OFFSET и COUNT(*)"""
+    ordering = '-id'
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
@@ -0,0 +1,26 @@
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'IN \(\?(?:, \?)*\)')
+SPACES = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Форма запроса: литералы заменены на ?, списки IN свёрнуты."""
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def record_queries(client, method, url, **kwargs):
+    """Выполняет запрос клиентом и возвращает формы всех SQL-запросов."""
+    with CaptureQueriesContext(connection) as context:
+        response = getattr(client, method)(url, **kwargs)
+    if response.status_code >= 400:
+        raise AssertionError(f'{url}: статус {response.status_code}')
+    return [normalize_sql(query['sql']) for query in context.captured_queries]
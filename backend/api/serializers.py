@@ -1,8 +1,9 @@
 import base64
 
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.core.files.base import ContentFile
-from django.db import transaction
+from django.db import models, transaction
 from djoser.serializers import UserSerializer
 from recipes.models import (CountIngredients, FavoriteRecipes, Ingredients,
                             Recipes, ShoppingCart, Tags)
@@ -10,6 +11,10 @@ from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from users.models import Subscriptions, User
 
+from .authors import get_authors, get_subscribed
+from .changes import decode_cursor
+from .snapshots import ingredient_snapshot
+
 
 class Base64ImageField(serializers.ImageField):
     """Функция для декодирования изображений"""
@@ -45,6 +50,8 @@ class CustomUserSerializer(UserSerializer):
         return data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         if user.is_authenticated:
             return Subscriptions.objects.filter(user=user, author=obj).exists()
@@ -117,16 +124,9 @@ class SubscribeSerializer(CustomUserSerializer):
             'last_name'
         )
 
-    def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (
-            self.context.get('request').user.is_authenticated
-            and Subscriptions.objects.filter(
-                user=user,
-                author=obj).exists()
-        )
-
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def validate(self, data):
@@ -137,11 +137,6 @@ class SubscribeSerializer(CustomUserSerializer):
                 detail='Нельзя подписаться на самого себя!',
                 code=status.HTTP_400_BAD_REQUEST
             )
-        if Subscriptions.objects.filter(user=user, author=author).exists():
-            raise serializers.ValidationError(
-                detail='Подписка на этого пользователя уже есть!',
-                code=status.HTTP_400_BAD_REQUEST
-            )
         return data
 
 
@@ -173,12 +168,14 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class CountIngredientReadSerializer(serializers.ModelSerializer):
-    """Список игредиентов и их количество в рецепте"""
-    id = serializers.ReadOnlyField(source='ingredients.id')
-    name = serializers.ReadOnlyField(source='ingredients.name')
-    measurement_unit = serializers.ReadOnlyField(
-        source='ingredients.measurement_unit'
-    )
+    """Список игредиентов и их количество в рецепте.
+
+    Название и единица измерения берутся из снимка справочника
+    в памяти, без JOIN с таблицей ингредиентов.
+    """
+    id = serializers.ReadOnlyField(source='ingredients_id')
+    name = serializers.SerializerMethodField()
+    measurement_unit = serializers.SerializerMethodField()
 
     class Meta:
         model = CountIngredients
@@ -189,6 +186,36 @@ class CountIngredientReadSerializer(serializers.ModelSerializer):
             'amount',
         )
 
+    def get_ingredient(self, obj):
+        record = ingredient_snapshot.get().get(obj.ingredients_id)
+        if record is None:
+            record = ingredient_snapshot.refresh().get(obj.ingredients_id)
+        return record or obj.ingredients
+
+    def get_name(self, obj):
+        return self.get_ingredient(obj).name
+
+    def get_measurement_unit(self, obj):
+        return self.get_ingredient(obj).measurement_unit
+
+
+class RecipesReadListSerializer(serializers.ListSerializer):
+    """Авторы и подписки на них для всей страницы рецептов разом"""
+    authors = None
+    subscribed = None
+
+    def to_representation(self, data):
+        recipes = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        author_ids = [recipe.author_id for recipe in recipes]
+        self.authors = get_authors(author_ids)
+        self.subscribed = get_subscribed(
+            self.context['request'].user,
+            author_ids
+        )
+        return super().to_representation(recipes)
+
 
 class RecipesReadSerializer(serializers.ModelSerializer):
     """Список рецептов"""
@@ -197,7 +224,7 @@ class RecipesReadSerializer(serializers.ModelSerializer):
         many=True,
         source='count_in_recipe'
     )
-    author = CustomUserSerializer(read_only=True)
+    author = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
@@ -216,8 +243,26 @@ class RecipesReadSerializer(serializers.ModelSerializer):
             'text',
             'cooking_time'
         )
+        list_serializer_class = RecipesReadListSerializer
+
+    def get_author(self, obj):
+        if isinstance(self.parent, RecipesReadListSerializer):
+            authors = self.parent.authors
+            subscribed = self.parent.subscribed
+        else:
+            authors = get_authors([obj.author_id])
+            subscribed = get_subscribed(
+                self.context['request'].user,
+                [obj.author_id]
+            )
+        return {
+            **authors[obj.author_id],
+            'is_subscribed': obj.author_id in subscribed,
+        }
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_authenticated:
             return FavoriteRecipes.objects.filter(
@@ -227,6 +272,8 @@ class RecipesReadSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_authenticated:
             return ShoppingCart.objects.filter(
@@ -366,16 +413,6 @@ class FavoriteSerializer(RecipesSerializer):
             'cooking_time'
         )
 
-    def validate(self, data):
-        recipe = self.instance
-        user = self.context.get('request').user
-        if FavoriteRecipes.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                detail='Этот рецепт уже в ибранном!',
-                code=status.HTTP_400_BAD_REQUEST
-            )
-        return data
-
 
 class ShoppingSerializer(RecipesSerializer):
     """Список покупок. Добавление и удаление"""
@@ -388,12 +425,62 @@ class ShoppingSerializer(RecipesSerializer):
             'cooking_time'
         )
 
-    def validate(self, data):
-        recipe = self.instance
-        user = self.context.get('request').user
-        if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                detail='Этот рецепт уже в списке!',
-                code=status.HTTP_400_BAD_REQUEST
-            )
-        return data
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE
+    )
+
+
+class CookSearchSerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE
+    )
+    tags = serializers.ListField(
+        child=serializers.SlugField(),
+        required=False
+    )
+    cooking_time_min = serializers.IntegerField(min_value=1, required=False)
+    cooking_time_max = serializers.IntegerField(min_value=1, required=False)
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class RecipeMatchSerializer(RecipesSerializer):
+    """Рецепт с числом недостающих ингредиентов"""
+    missing = serializers.ReadOnlyField()
+    coverage = serializers.ReadOnlyField()
+
+    class Meta(RecipesSerializer.Meta):
+        fields = RecipesSerializer.Meta.fields + ('missing', 'coverage')
+
+
+class ChangesSerializer(serializers.Serializer):
+    """Параметры ленты изменений рецептов"""
+    since = serializers.CharField(required=False)
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.CHANGES_MAX_PAGE_SIZE,
+        default=settings.CHANGES_PAGE_SIZE
+    )
+
+    def validate_since(self, value):
+        try:
+            return decode_cursor(value)
+        except ValueError:
+            raise ValidationError('Неверный курсор')
+
+
+class SQLStatsSerializer(serializers.Serializer):
+    """Параметры отчёта о SQL-запросах процесса"""
+    group = serializers.ChoiceField(
+        choices=('view', 'fingerprint'),
+        default='view'
+    )
+    view = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
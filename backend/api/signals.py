@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import CountIngredients, Ingredients, Recipes, Tags
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .authentication import invalidate_token, invalidate_user_tokens
+from .authors import AUTHOR, author_cache
+from .cache import bump_versions
+from .snapshots import (INGREDIENTS, RECIPE_INDEX, bump_snapshots,
+                        ingredient_snapshot)
+
+FEED = 'recipes:feed'
+TAGS = 'recipes:tags'
+RECIPE = 'recipes:detail:{}'
+
+
+def bump_on_commit(*names):
+    """Версии меняются после коммита: иначе запрос между сбросом и
+    коммитом пересчитает старые данные и закеширует их под новой
+    версией."""
+    transaction.on_commit(lambda: bump_versions(*names))
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_delete, sender=Recipes)
+def recipe_changed(sender, instance, **kwargs):
+    bump_on_commit(FEED, RECIPE.format(instance.pk))
+    bump_snapshots(RECIPE_INDEX)
+
+
+@receiver(post_save, sender=CountIngredients)
+@receiver(post_delete, sender=CountIngredients)
+def count_ingredients_changed(sender, instance, **kwargs):
+    bump_on_commit(FEED, RECIPE.format(instance.recipe_id))
+    bump_snapshots(RECIPE_INDEX)
+
+
+@receiver(m2m_changed, sender=Recipes.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        bump_on_commit(FEED, TAGS)
+    else:
+        bump_on_commit(FEED, RECIPE.format(instance.pk))
+    bump_snapshots(RECIPE_INDEX)
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_delete, sender=Tags)
+def tag_changed(sender, instance, **kwargs):
+    bump_on_commit(FEED, TAGS)
+    bump_snapshots(RECIPE_INDEX)
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+def ingredient_changed(sender, instance, **kwargs):
+    bump_on_commit(FEED, INGREDIENTS)
+    bump_snapshots(INGREDIENTS)
+    transaction.on_commit(ingredient_snapshot.expire)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    recipes = instance.recipes.values_list('pk', flat=True)
+    bump_on_commit(
+        FEED,
+        AUTHOR.format(instance.pk),
+        *(RECIPE.format(pk) for pk in recipes)
+    )
+    transaction.on_commit(lambda: author_cache.delete(instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user_tokens(instance.pk)
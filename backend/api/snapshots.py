@@ -0,0 +1,251 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from recipes.models import CountIngredients, Ingredients, Recipes, Tags
+
+from .models import SnapshotVersion
+
+INGREDIENTS = 'recipes:ingredients'
+RECIPE_INDEX = 'recipes:index'
+UINT_MAX = 2 ** 32 - 1
+
+
+def bump_snapshots(*names):
+    """Новое поколение снимков после коммита текущей транзакции.
+
+    Версия живёт в базе, а не в кеше, поэтому её видят все процессы
+    независимо от бэкенда кеша. Увеличивается она после коммита:
+    собравший снимок по новому номеру уже видит новые данные, а строка
+    версии не блокируется на всё время транзакции.
+    """
+    transaction.on_commit(lambda: _bump(names))
+
+
+def _bump(names):
+    for name in names:
+        updated = SnapshotVersion.objects.filter(name=name).update(
+            version=F('version') + 1
+        )
+        if not updated:
+            SnapshotVersion.objects.get_or_create(
+                name=name, defaults={'version': 1}
+            )
+
+
+def get_snapshot_version(name):
+    return SnapshotVersion.objects.filter(name=name).values_list(
+        'version', flat=True
+    ).first() or 0
+
+
+class VersionedSnapshot:
+    """Данные в памяти процесса, перестраиваемые при смене поколения.
+
+    Поколение читается из SnapshotVersion не чаще раза в
+    SNAPSHOT_CHECK_INTERVAL секунд и не раньше чем через rebuild_interval
+    секунд после прошлой сборки: при частой записи изменения копятся и
+    применяются одной сборкой. Новые данные собираются в фоновом
+    потоке, запросы до конца сборки получают прежние; синхронно
+    строится только первый снимок процесса.
+    """
+    version_name = None
+
+    def __init__(self, rebuild_interval=0):
+        self.rebuild_interval = rebuild_interval
+        self._data = None
+        self._version = None
+        self._checked_at = 0
+        self._built_at = 0
+        self._building = False
+        self._lock = threading.Lock()
+
+    def build(self):
+        raise NotImplementedError
+
+    def expire(self):
+        self._checked_at = 0
+
+    def refresh(self):
+        with self._lock:
+            self._version = get_snapshot_version(self.version_name)
+            self._built_at = time.monotonic()
+            self._data = self.build()
+            self._checked_at = time.monotonic()
+        return self._data
+
+    def get(self):
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._version = get_snapshot_version(self.version_name)
+                    self._built_at = time.monotonic()
+                    self._data = self.build()
+                    self._checked_at = time.monotonic()
+            return self._data
+        now = time.monotonic()
+        with self._lock:
+            if (now - self._checked_at < settings.SNAPSHOT_CHECK_INTERVAL
+                    or now - self._built_at < self.rebuild_interval):
+                return self._data
+            self._checked_at = now
+        version = get_snapshot_version(self.version_name)
+        with self._lock:
+            if version != self._version and not self._building:
+                self._building = True
+                self._built_at = now
+                threading.Thread(
+                    target=self._rebuild, args=(version,), daemon=True
+                ).start()
+        return self._data
+
+    def _rebuild(self, version):
+        try:
+            data = self.build()
+            with self._lock:
+                self._data = data
+                self._version = version
+        finally:
+            self._building = False
+            connections.close_all()
+
+
+class Ingredient:
+    __slots__ = ('id', 'name', 'measurement_unit')
+
+    def __init__(self, pk, name, measurement_unit):
+        self.id = pk
+        self.name = name
+        self.measurement_unit = measurement_unit
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'measurement_unit': self.measurement_unit,
+        }
+
+
+class IngredientTable:
+    """Справочник ингредиентов: поиск по id и по началу названия."""
+
+    def __init__(self, rows):
+        self.records = [Ingredient(*row) for row in rows]
+        self.by_id = {record.id: record for record in self.records}
+        self.by_name = sorted(self.records, key=lambda record: record.name)
+        self.names = [record.name for record in self.by_name]
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def startswith(self, prefix):
+        start = bisect_left(self.names, prefix)
+        end = bisect_left(self.names, prefix + '\uffff', lo=start)
+        return self.by_name[start:end]
+
+
+class IngredientSnapshot(VersionedSnapshot):
+    version_name = INGREDIENTS
+
+    def build(self):
+        return IngredientTable(Ingredients.objects.order_by('pk').values_list(
+            'pk', 'name', 'measurement_unit'
+        ))
+
+
+ingredient_snapshot = IngredientSnapshot()
+
+
+class RecipeIndex:
+    """Инвертированный индекс: ингредиент -> позиции рецептов.
+
+    Рецепты нумеруются по возрастанию id, списки позиций хранятся
+    отсортированными массивами array('I'), время приготовления и число
+    ингредиентов — параллельными массивами, теги — битовыми масками.
+    Время приготовления приводится к диапазону array('I'): import_recipes
+    не проверяет его валидаторами модели.
+    """
+
+    def __init__(self, recipes, tags, recipe_tags, recipe_ingredients):
+        self.ids = array('q')
+        self.cooking_times = array('I')
+        position = {}
+        for pk, cooking_time in recipes:
+            position[pk] = len(self.ids)
+            self.ids.append(pk)
+            self.cooking_times.append(min(max(cooking_time, 0), UINT_MAX))
+        self.tag_bits = {slug: 1 << bit for bit, slug in enumerate(tags)}
+        self.tag_masks = [0] * len(self.ids)
+        for recipe_id, slug in recipe_tags:
+            if recipe_id in position and slug in self.tag_bits:
+                self.tag_masks[position[recipe_id]] |= self.tag_bits[slug]
+        self.totals = array('I', bytes(4 * len(self.ids)))
+        self.postings = {}
+        for recipe_id, ingredient_id in recipe_ingredients:
+            if recipe_id not in position:
+                continue
+            index = position[recipe_id]
+            self.totals[index] += 1
+            self.postings.setdefault(ingredient_id, array('I')).append(index)
+
+    def search(self, ingredient_ids, tags=(), cooking_time_min=None,
+               cooking_time_max=None, max_missing=None):
+        """Рецепты хотя бы с одним из ингредиентов.
+
+        Возвращает кортежи (id, недостающих, доля имеющихся) по
+        возрастанию числа недостающих, затем по убыванию доли.
+        """
+        mask = 0
+        for slug in tags:
+            mask |= self.tag_bits.get(slug, 0)
+        if tags and not mask:
+            return []
+        matches = Counter(chain.from_iterable(
+            self.postings.get(pk, ()) for pk in set(ingredient_ids)
+        ))
+        results = []
+        for index, matched in matches.items():
+            minutes = self.cooking_times[index]
+            if cooking_time_min is not None and minutes < cooking_time_min:
+                continue
+            if cooking_time_max is not None and minutes > cooking_time_max:
+                continue
+            if mask and not self.tag_masks[index] & mask:
+                continue
+            total = self.totals[index]
+            missing = total - matched
+            if max_missing is not None and missing > max_missing:
+                continue
+            results.append((missing, -matched / total, -self.ids[index]))
+        results.sort()
+        return [
+            (-recipe_id, missing, -coverage)
+            for missing, coverage, recipe_id in results
+        ]
+
+
+class RecipeIndexSnapshot(VersionedSnapshot):
+    version_name = RECIPE_INDEX
+
+    def build(self):
+        return RecipeIndex(
+            Recipes.objects.order_by('pk').values_list('pk', 'cooking_time'),
+            Tags.objects.order_by('pk').values_list('slug', flat=True),
+            Recipes.tags.through.objects.values_list(
+                'recipes_id', 'tags__slug'
+            ),
+            CountIngredients.objects.order_by(
+                'recipe_id', 'ingredients_id'
+            ).values_list('recipe_id', 'ingredients_id').distinct()
+        )
+
+
+recipe_index_snapshot = RecipeIndexSnapshot(
+    settings.RECIPE_INDEX_REBUILD_INTERVAL
+)
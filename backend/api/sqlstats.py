@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+
+from .querycount import normalize_sql
+
+OVERFLOW = '<other>'
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Форма запроса без литералов и параметров."""
+    return normalize_sql(sql.replace('%s', '?'))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class SQLStats:
+    """Статистика запросов процесса по парам (view, форма запроса).
+
+    Число пар ограничено max_entries, новые сверх лимита копятся в одной
+    записи OVERFLOW. p95 считается по последним samples длительностям.
+    """
+
+    def __init__(self, max_entries, samples):
+        self.max_entries = max_entries
+        self.samples = samples
+        self.started = time.time()
+        self.dumped_at = time.monotonic()
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, view, queries):
+        with self._lock:
+            for sql, time_ms in queries:
+                key = (view, sql)
+                entry = self._entries.get(key)
+                if entry is None:
+                    if len(self._entries) >= self.max_entries:
+                        key = (OVERFLOW, OVERFLOW)
+                        entry = self._entries.get(key)
+                    if entry is None:
+                        entry = self._entries[key] = [
+                            0, 0.0, 0.0, deque(maxlen=self.samples)
+                        ]
+                entry[0] += 1
+                entry[1] += time_ms
+                entry[2] = max(entry[2], time_ms)
+                entry[3].append(time_ms)
+
+    def report(self, by_view=True):
+        """Записи по убыванию суммарного времени.
+
+        При by_view=False одинаковые формы из разных view складываются.
+        """
+        with self._lock:
+            entries = [
+                (view, sql, count, total, longest, list(samples))
+                for (view, sql), (count, total, longest, samples)
+                in self._entries.items()
+            ]
+        if not by_view:
+            merged = {}
+            for _, sql, count, total, longest, samples in entries:
+                entry = merged.setdefault(sql, [None, sql, 0, 0.0, 0.0, []])
+                entry[2] += count
+                entry[3] += total
+                entry[4] = max(entry[4], longest)
+                entry[5].extend(samples)
+            entries = merged.values()
+        return sorted(
+            (
+                {
+                    'view': view,
+                    'sql': sql,
+                    'count': count,
+                    'total_ms': round(total, 3),
+                    'avg_ms': round(total / count, 3),
+                    'p95_ms': round(percentile(samples, 0.95), 3),
+                    'max_ms': round(longest, 3),
+                }
+                for view, sql, count, total, longest, samples in entries
+            ),
+            key=lambda entry: entry['total_ms'],
+            reverse=True
+        )
+
+    def dump_due(self, interval):
+        """True не чаще раза в interval секунд, даже из разных потоков."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self.dumped_at < interval:
+                return False
+            self.dumped_at = now
+            return True
+
+    def dump(self, path):
+        """Дописывает текущую статистику строкой JSON в файл."""
+        line = json.dumps({
+            'time': time.time(),
+            'pid': os.getpid(),
+            'since': self.started,
+            'queries': self.report(),
+        }, ensure_ascii=False)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as log_file:
+            log_file.write(line + '\n')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.started = time.time()
+
+
+sql_stats = SQLStats(
+    settings.SQL_STATS_MAX_ENTRIES,
+    settings.SQL_STATS_SAMPLES
+)
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from unittest import skipIf
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from recipes.models import FavoriteRecipes, Recipes, ShoppingCart
+from rest_framework.test import APIClient
+from users.models import Subscriptions, User
+
+REQUESTS = 8
+
+
+@skipIf(
+    connection.vendor == 'sqlite',
+    'SQLite в памяти блокирует таблицу целиком и отвечает на гонку ошибкой'
+)
+class ConcurrentToggleTest(TransactionTestCase):
+    """Одновременные POST одного и того же добавления.
+
+    Ровно один запрос создаёт строку, остальные получают 400 от
+    ограничения уникальности, а не 500.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+        self.recipe = Recipes.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=10
+        )
+
+    def post_concurrently(self, url):
+        barrier = Barrier(REQUESTS)
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                return client.post(url).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=REQUESTS) as pool:
+            futures = [pool.submit(post) for _ in range(REQUESTS)]
+        return sorted(future.result() for future in futures)
+
+    def assert_single(self, url, queryset):
+        codes = self.post_concurrently(url)
+        self.assertEqual(codes, [201] + [400] * (REQUESTS - 1))
+        self.assertEqual(queryset.count(), 1)
+
+    def test_favorite(self):
+        self.assert_single(
+            f'/api/recipes/{self.recipe.pk}/favorite/',
+            FavoriteRecipes.objects.filter(user=self.user, recipe=self.recipe)
+        )
+
+    def test_shopping_cart(self):
+        self.assert_single(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+            ShoppingCart.objects.filter(user=self.user, recipe=self.recipe)
+        )
+
+    def test_subscribe(self):
+        self.assert_single(
+            f'/api/users/{self.author.pk}/subscribe/',
+            Subscriptions.objects.filter(user=self.user, author=self.author)
+        )
@@ -0,0 +1,94 @@
+import time
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Ограничение частоты действий по скользящему окну.
+
+    На каждый ключ в кеше хранятся только два счётчика: текущего и
+    предыдущего окна. Оценка числа запросов за последние duration секунд
+    складывается из текущего счётчика и доли предыдущего. Счётчики живут
+    в общем кеше, поэтому лимит общий для всех воркеров.
+
+    Запрос сначала атомарно увеличивает счётчик текущего окна и только
+    потом сравнивает оценку с лимитом: каждый параллельный запрос видит
+    своё значение, и пропустить больше лимита они не могут. Отклонённый
+    запрос возвращает свой инкремент обратно.
+
+    Область действия берётся из view.throttle_scopes по имени action,
+    лимит — из DEFAULT_THROTTLE_RATES по ключу '<scope>_<suffix>'.
+    """
+    suffix = None
+    cache = cache
+
+    def get_ident_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None)
+        )
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(
+            f'{scope}_{self.suffix}'
+        )
+        if rate is None:
+            return True
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+        num_requests, duration = parse_rate(rate)
+        now = time.time()
+        window = int(now // duration)
+        prefix = f'throttle:{scope}_{self.suffix}:{ident}:'
+        current_key = f'{prefix}{window}'
+        previous_key = f'{prefix}{window - 1}'
+        count = self.increment(current_key, duration * 2)
+        weight = 1 - (now - window * duration) / duration
+        estimate = self.cache.get(previous_key, 0) * weight + count
+        if estimate > num_requests:
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            self.wait_time = duration * weight
+            return False
+        return True
+
+    def increment(self, key, timeout):
+        if self.cache.add(key, 1, timeout):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Ключ вытеснен между add и incr.
+            self.cache.set(key, 1, timeout)
+            return 1
+
+    def wait(self):
+        return getattr(self, 'wait_time', None)
+
+
+class UserActionThrottle(SlidingWindowThrottle):
+    suffix = 'user'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPActionThrottle(SlidingWindowThrottle):
+    suffix = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
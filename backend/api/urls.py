@@ -2,7 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (CustomUserViewSet, IngredientsViewSet, RecipeViewSet,
-                    TagViewSet)
+                    SQLStatsView, TagViewSet)
 
 router = DefaultRouter()
 router.register('users', CustomUserViewSet, basename='users')
@@ -13,4 +13,5 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('sql-stats/', SQLStatsView.as_view(), name='sql-stats'),
 ]
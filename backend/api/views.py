@@ -1,23 +1,99 @@
+import os
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef, Q
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from recipes.models import (CountIngredients, FavoriteRecipes, Ingredients,
-                            Recipes, ShoppingCart, Tags)
+                            Recipes, ShoppingCart, SimilarRecipe, Tags)
+from recipes.purge import soft_delete
 from rest_framework import filters, mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Subscriptions, User
 
-from .filters import CustomRecipesFilter, IngredientFilter
-from .paginator import CustomPaginator
+from .cache import get_or_compute, get_versions, make_key
+from .changes import encode_cursor, recipe_changes
+from .filters import CustomRecipesFilter
+from .paginator import EstimatedPaginator, KeysetPaginator
 from .permissions import AuthorOrReadOnly, ObjectIsAuthenticated
-from .serializers import (CustomUserSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipesReadSerializer,
-                          RecipesWriteSerializer, SetPasswordSerializer,
-                          ShoppingSerializer, SubscribeSerializer,
+from .serializers import (ChangesSerializer, CookSearchSerializer,
+                          CustomUserSerializer, FavoriteSerializer,
+                          IngredientSerializer, RecipeIdsSerializer,
+                          RecipeMatchSerializer, RecipesReadSerializer,
+                          RecipesSerializer, RecipesWriteSerializer,
+                          SetPasswordSerializer, ShoppingSerializer,
+                          SQLStatsSerializer, SubscribeSerializer,
                           TagSerializer)
+from .signals import FEED, INGREDIENTS, RECIPE, TAGS
+from .snapshots import ingredient_snapshot, recipe_index_snapshot
+from .sqlstats import sql_stats
+
+
+def annotate_subscribed(queryset, user):
+    """Флаг is_subscribed одним подзапросом вместо запроса на строку."""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(is_subscribed=Exists(
+        Subscriptions.objects.filter(user=user, author=OuterRef('pk'))
+    ))
+
+
+def annotate_recipe_flags(queryset, user):
+    """Флаги избранного и списка покупок подзапросами."""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(
+        is_favorited=Exists(FavoriteRecipes.objects.filter(
+            user=user,
+            recipe=OuterRef('pk')
+        )),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            user=user,
+            recipe=OuterRef('pk')
+        )),
+    )
+
+
+class EdgeCacheMixin:
+    """Cache-Control для микрокеша nginx.
+
+    Ответы list и retrieve анонимам общие для всех и кешируются на
+    EDGE_CACHE_TIMEOUT секунд, ответы авторизованным — только private.
+    Сбрасывать записи nginx не умеет, поэтому правка видна анонимам
+    не позже чем через EDGE_CACHE_TIMEOUT секунд; 404 после удаления
+    кешируется так же.
+    """
+    edge_cache_actions = ('list', 'retrieve')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (request.method in ('GET', 'HEAD')
+                and self.action in self.edge_cache_actions
+                and response.status_code in (200, 404)):
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, max_age=0)
+            else:
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=0,
+                    s_maxage=settings.EDGE_CACHE_TIMEOUT
+                )
+            patch_vary_headers(response, ('Authorization',))
+        return response
 
 
 class CreateListDestroyViewSet(
@@ -37,11 +113,27 @@ class CreateListRetrieveViewSet(
 
 
 class CustomUserViewSet(CreateListRetrieveViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('-id')
     serializer_class = CustomUserSerializer
     permission_classes = [ObjectIsAuthenticated]
     pagination_class = PageNumberPagination
     filter_backends = (filters.SearchFilter,)
+    search_fields = ('^username', '^email')
+    throttle_scopes = {'subscribe': 'subscribe'}
+
+    def get_queryset(self):
+        return annotate_subscribed(super().get_queryset(), self.request.user)
+
+    @property
+    def paginator(self):
+        """Без параметра page список отдаётся по курсору (keyset)."""
+        if not hasattr(self, '_paginator'):
+            if (self.action == 'list'
+                    and 'page' not in self.request.query_params):
+                self._paginator = KeysetPaginator()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
 
     @action(
         methods=['get'],
@@ -50,14 +142,11 @@ class CustomUserViewSet(CreateListRetrieveViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def me(self, request):
-        user = get_object_or_404(User, username=self.request.user)
-        if request.method == 'GET':
-            serializer = CustomUserSerializer(
-                user,
-                context={'request': request},
-            )
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return status.HTTP_401_UNAUTHORIZED
+        serializer = CustomUserSerializer(
+            request.user,
+            context={'request': request},
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
         methods=['post'],
@@ -68,15 +157,15 @@ class CustomUserViewSet(CreateListRetrieveViewSet):
     def set_password(self, request):
         serializer = SetPasswordSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = get_object_or_404(User, username=self.request.user)
+        user = request.user
         if not user.check_password(
                 serializer.validated_data['current_password']):
             return Response(
                 'Неверный текущий пароль',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        self.request.user.set_password(serializer.data["new_password"])
-        self.request.user.save()
+        user.set_password(serializer.data["new_password"])
+        user.save(update_fields=['password'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -84,10 +173,19 @@ class CustomUserViewSet(CreateListRetrieveViewSet):
         detail=False,
         url_path='subscriptions',
         permission_classes=(IsAuthenticated,),
-        pagination_class=CustomPaginator
+        pagination_class=EstimatedPaginator
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscriptions__user=request.user)
+        queryset = annotate_subscribed(
+            User.objects.filter(subscriptions__user=request.user),
+            request.user
+        ).annotate(
+            recipes_count=Count(
+                'recipes',
+                filter=Q(recipes__deleted_at__isnull=True),
+                distinct=True
+            )
+        ).prefetch_related('recipes').order_by('-id')
         page = self.paginate_queryset(queryset)
         serializer = SubscribeSerializer(
             page,
@@ -102,83 +200,286 @@ class CustomUserViewSet(CreateListRetrieveViewSet):
         url_path='subscribe',
         permission_classes=(IsAuthenticated,),
     )
-    def subscribe(self, request, **kwargs):
+    def subscribe(self, request, pk):
         user = request.user
-        author = get_object_or_404(User, id=kwargs['pk'])
         if request.method == 'POST':
+            author = get_object_or_404(User, id=pk)
             serializer = SubscribeSerializer(
                 author,
                 data=request.data,
                 context={'request': request})
             serializer.is_valid(raise_exception=True)
-            Subscriptions.objects.create(
-                user=user,
-                author=author
-            )
+            try:
+                with transaction.atomic():
+                    Subscriptions.objects.create(user=user, author=author)
+            except IntegrityError:
+                return Response(
+                    {'errors': 'Подписка на этого пользователя уже есть!'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            subscription = get_object_or_404(
-                Subscriptions,
-                user=user,
-                author=author)
-            subscription.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return
+        deleted, _ = Subscriptions.objects.filter(
+            user=user,
+            author_id=pk
+        ).delete()
+        if not deleted:
+            get_object_or_404(User, id=pk)
+            return Response(
+                {'errors': 'Подписки на этого пользователя нет!'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(EdgeCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tags.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(EdgeCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredients.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """Список из снимка; ?name= — поиск по началу названия."""
+        table = ingredient_snapshot.get()
+        name = request.query_params.get('name')
+        records = table.startswith(name) if name else table.records
+        return Response([record.as_dict() for record in records])
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            record = ingredient_snapshot.get().get(int(kwargs['pk']))
+        except ValueError:
+            record = None
+        if record is None:
+            raise NotFound()
+        return Response(record.as_dict())
+
+
+class RecipeViewSet(EdgeCacheMixin, viewsets.ModelViewSet):
     queryset = Recipes.objects.all()
-    pagination_class = CustomPaginator
+    pagination_class = EstimatedPaginator
     permission_classes = [AuthorOrReadOnly]
     http_method_names = ['get', 'post', 'create', 'patch', 'delete']
     filter_backends = (DjangoFilterBackend,)
     filterset_class = CustomRecipesFilter
+    throttle_scopes = {
+        'create': 'recipe_create',
+        'favorite': 'favorite',
+        'favorite_batch': 'favorite',
+        'shopping_cart': 'shopping_cart',
+        'shopping_cart_batch': 'shopping_cart',
+        'download_shopping_cart': 'download_shopping_cart',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'bulk'):
+            return queryset
+        return annotate_recipe_flags(
+            queryset.prefetch_related(
+                'tags',
+                'count_in_recipe'
+            ),
+            self.request.user
+        )
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve)'):
+        if self.action in ('list', 'retrieve', 'bulk'):
             return RecipesReadSerializer
         return RecipesWriteSerializer
 
-    @action(
-        methods=['post', 'delete'],
-        detail=True,
-        url_path='favorite',
-        permission_classes=(IsAuthenticated,),
-    )
-    def favorite(self, request, **kwargs):
-        recipe = get_object_or_404(Recipes, id=kwargs['pk'])
+    def perform_destroy(self, instance):
+        """Рецепт скрывается сразу, зависимые строки и картинка
+        удаляются фоновой задачей."""
+        soft_delete(instance)
+
+    def cached_response(self, request, key, compute):
+        """Общий для анонимных пользователей ответ из кеша.
+
+        ETag строится по версии ключа, поэтому на If-None-Match
+        отвечаем 304 без обращения к базе и сериализации.
+        """
+        etag = quote_etag(key)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+        data = get_or_compute(key, lambda: compute().data)
+        response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        feed_version, = get_versions(FEED)
+        key = make_key(
+            'recipes:feed',
+            feed_version,
+            sorted(request.query_params.lists())
+        )
+        return self.cached_response(
+            request, key, partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().retrieve(request, *args, **kwargs)
+        pk = kwargs[self.lookup_field]
+        key = make_key(
+            'recipes:detail',
+            pk,
+            *get_versions(RECIPE.format(pk), TAGS, INGREDIENTS)
+        )
+        return self.cached_response(
+            request, key, partial(super().retrieve, request, *args, **kwargs)
+        )
+
+    @action(detail=False, methods=['get'], url_path='bulk')
+    def bulk(self, request):
+        """Несколько рецептов по ids=1,2,3 одним набором запросов.
+
+        Рецепты возвращаются в порядке запроса, несуществующие id
+        пропускаются.
+        """
+        ids = request.query_params.get('ids', '')
+        serializer = RecipeIdsSerializer(data={
+            'recipes': [pk for pk in ids.split(',') if pk]
+        })
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes],
+            many=True
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        """Лента изменений для синхронизации: ?since=<курсор из next>."""
+        params = ChangesSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data.get('since')
+        changes, has_more = recipe_changes(
+            since, params.validated_data['limit']
+        )
+        cursor = request.query_params.get('since')
+        if changes:
+            cursor = encode_cursor(*changes[-1][:2])
+        return Response({
+            'results': [
+                {'id': pk, 'change': change, 'at': at}
+                for at, pk, change in changes
+            ],
+            'next': cursor,
+            'has_more': has_more,
+        })
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk):
+        """Похожие рецепты из заранее посчитанной таблицы SimilarRecipe."""
+        recipe = get_object_or_404(Recipes, pk=pk)
+        rows = SimilarRecipe.objects.filter(
+            recipe=recipe,
+            similar__deleted_at__isnull=True
+        ).select_related('similar').order_by('-score', 'similar_id')
+        serializer = RecipesSerializer(
+            [row.similar for row in rows],
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='cook')
+    def cook(self, request):
+        """Что приготовить из имеющихся ингредиентов.
+
+        Ранжирование идёт по индексу в памяти процесса, из базы
+        читаются только рецепты текущей страницы.
+        """
+        params = request.query_params
+        search = CookSearchSerializer(data={
+            **params.dict(),
+            'ingredients': params.getlist('ingredients'),
+            'tags': params.getlist('tags'),
+        })
+        search.is_valid(raise_exception=True)
+        matches = recipe_index_snapshot.get().search(
+            search.validated_data.pop('ingredients'),
+            **search.validated_data
+        )
+        page = self.paginate_queryset(matches)
+        recipes = Recipes.objects.in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        results = []
+        for recipe_id, missing, coverage in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.missing = missing
+            recipe.coverage = round(coverage, 3)
+            results.append(recipe)
+        serializer = RecipeMatchSerializer(
+            results,
+            many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def toggle_relation(self, request, pk, model, serializer_class, errors):
+        """Добавление или удаление рецепта из списка пользователя.
+
+        Дубликаты отсекает ограничение уникальности, а не предварительная
+        проверка, поэтому одновременные запросы не приводят к ошибке 500.
+        """
         user = request.user
         if request.method == 'POST':
-            serializer = FavoriteSerializer(
+            recipe = get_object_or_404(Recipes, id=pk)
+            try:
+                with transaction.atomic():
+                    model.objects.create(user=user, recipe=recipe)
+            except IntegrityError:
+                return Response(
+                    {'errors': errors['exists']},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = serializer_class(
                 recipe,
-                data=request.data,
                 context={'request': request}
             )
-            serializer.is_valid(raise_exception=True)
-            FavoriteRecipes.objects.create(recipe=recipe, user=user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            favorite_recipe = get_object_or_404(
-                FavoriteRecipes,
-                recipe=recipe,
-                user=user)
-            favorite_recipe.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return
+        deleted, _ = model.objects.filter(user=user, recipe_id=pk).delete()
+        if not deleted:
+            get_object_or_404(Recipes, id=pk)
+            return Response(
+                {'errors': errors['missing']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        methods=['post', 'delete'],
+        detail=True,
+        url_path='favorite',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite(self, request, pk):
+        return self.toggle_relation(
+            request,
+            pk,
+            FavoriteRecipes,
+            FavoriteSerializer,
+            {
+                'exists': 'Этот рецепт уже в избранном!',
+                'missing': 'Этого рецепта нет в избранном!',
+            }
+        )
 
     @action(
         methods=['post', 'delete'],
@@ -186,25 +487,91 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path='shopping_cart',
         permission_classes=(IsAuthenticated,),
     )
-    def shopping_cart(self, request, **kwargs):
-        recipe = get_object_or_404(Recipes, id=kwargs['pk'])
+    def shopping_cart(self, request, pk):
+        return self.toggle_relation(
+            request,
+            pk,
+            ShoppingCart,
+            ShoppingSerializer,
+            {
+                'exists': 'Этот рецепт уже в списке!',
+                'missing': 'Этого рецепта нет в списке!',
+            }
+        )
+
+    def batch_relation(self, request, model):
+        """Пакетное добавление или удаление рецептов из списка.
+
+        Существование рецептов и наличие их в списке проверяются одним
+        запросом, вставка идёт одним INSERT с ignore_conflicts на
+        ограничениях уникальности. Возвращает статус для каждого id.
+        bulk_create не шлёт сигналов, и какие строки он вставил,
+        неизвестно, поэтому favorites_count пересчитывается по таблице
+        под блокировкой строк рецептов.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['recipes']))
         user = request.user
-        if request.method == 'POST':
-            serializer = ShoppingSerializer(
-                recipe,
-                data=request.data,
-                context={'request': request}
+        favorites = model is FavoriteRecipes
+        with transaction.atomic():
+            if favorites:
+                list(Recipes.objects.select_for_update().filter(
+                    id__in=ids
+                ).order_by('pk').values_list('pk'))
+            in_list = dict(
+                Recipes.objects.filter(id__in=ids).annotate(
+                    in_list=Exists(model.objects.filter(
+                        user=user,
+                        recipe=OuterRef('pk')
+                    ))
+                ).values_list('id', 'in_list')
             )
-            serializer.is_valid(raise_exception=True)
-            ShoppingCart.objects.create(recipe=recipe, user=user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if request.method == 'DELETE':
-            shopping_cart = get_object_or_404(
-                ShoppingCart,
-                recipe=recipe,
-                user=user)
-            shopping_cart.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            if request.method == 'POST':
+                model.objects.bulk_create(
+                    [model(user=user, recipe_id=pk)
+                     for pk, exists in in_list.items() if not exists],
+                    ignore_conflicts=True
+                )
+                statuses = {True: 'exists', False: 'created'}
+            else:
+                model.objects.filter(
+                    user=user,
+                    recipe_id__in=[
+                        pk for pk, exists in in_list.items() if exists
+                    ]
+                ).delete()
+                statuses = {True: 'deleted', False: 'not_in_list'}
+            if favorites:
+                Recipes.objects.filter(id__in=ids).recount_favorites()
+        results = [
+            {
+                'id': pk,
+                'status': (
+                    statuses[in_list[pk]] if pk in in_list else 'not_found'
+                )
+            }
+            for pk in ids
+        ]
+        return Response(results, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        url_path='favorite',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_batch(self, request):
+        return self.batch_relation(request, FavoriteRecipes)
+
+    @action(
+        methods=['post', 'delete'],
+        detail=False,
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_batch(self, request):
+        return self.batch_relation(request, ShoppingCart)
 
     @action(
         methods=['get'],
@@ -214,7 +581,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         ingredients = CountIngredients.objects.filter(
-            recipe__shopping_recipe__user=request.user).values(
+            recipe__shopping_recipe__user=request.user,
+            recipe__deleted_at__isnull=True).values(
             'ingredients__name', 'ingredients__measurement_unit', 'amount'
         )
         shopping_cart = {}
@@ -235,3 +603,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
         response = HttpResponse(text_file, content_type='text/plain')
         response['Content-Disposition'] = f'attachment; filename={name_file}'
         return response
+
+
+class SQLStatsView(APIView):
+    """Статистика SQL текущего процесса по формам запросов.
+
+    Каждый воркер копит свою статистику, сводная картина по всем
+    воркерам — в SQL_STATS_LOG. DELETE обнуляет статистику процесса.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        params = SQLStatsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        view = params.validated_data.get('view')
+        queries = sql_stats.report(
+            by_view=params.validated_data['group'] == 'view'
+        )
+        if view:
+            queries = [
+                query for query in queries
+                if query['view'] and view in query['view']
+            ]
+        return Response({
+            'enabled': settings.SQL_STATS_ENABLED,
+            'pid': os.getpid(),
+            'since': sql_stats.started,
+            'results': queries[:params.validated_data['limit']],
+        })
+
+    def delete(self, request):
+        sql_stats.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
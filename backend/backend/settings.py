@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'users',
     'recipes',
     'api',
+    'tasks',
     'django_filters',
     'corsheaders',
     'colorfield',
@@ -32,11 +33,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.SQLStatsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,6 +79,25 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', 300))
+CACHE_STALE_TIMEOUT = int(os.getenv('CACHE_STALE_TIMEOUT', 60))
+CACHE_LOCK_TIMEOUT = int(os.getenv('CACHE_LOCK_TIMEOUT', 10))
+CACHE_LOCK_POLL = 0.05
+
+SNAPSHOT_CHECK_INTERVAL = int(os.getenv('SNAPSHOT_CHECK_INTERVAL', 5))
+RECIPE_INDEX_REBUILD_INTERVAL = int(
+    os.getenv('RECIPE_INDEX_REBUILD_INTERVAL', 60)
+)
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -123,10 +147,83 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.'
                                 'PageNumberPagination',
-    "PAGE_SIZE": 1, }
+    "PAGE_SIZE": 1,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserActionThrottle',
+        'api.throttling.IPActionThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'favorite_user': '60/min',
+        'favorite_ip': '120/min',
+        'shopping_cart_user': '60/min',
+        'shopping_cart_ip': '120/min',
+        'subscribe_user': '30/min',
+        'subscribe_ip': '60/min',
+        'recipe_create_user': '10/min',
+        'recipe_create_ip': '20/min',
+        'download_shopping_cart_user': '10/min',
+        'download_shopping_cart_ip': '20/min',
+    },
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)), }
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 60))
 
 CORS_ORIGIN_ALLOW_ALL = True
+
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 100))
+
+TASKS_EAGER = os.getenv('TASKS_EAGER', 'False') == 'True'
+TASKS_WORKERS = int(os.getenv('TASKS_WORKERS', 4))
+TASKS_MAX_ATTEMPTS = int(os.getenv('TASKS_MAX_ATTEMPTS', 3))
+TASKS_RETRY_DELAY = int(os.getenv('TASKS_RETRY_DELAY', 10))
+TASKS_TIMEOUT = int(os.getenv('TASKS_TIMEOUT', 600))
+TASKS_HEARTBEAT = int(os.getenv('TASKS_HEARTBEAT', TASKS_TIMEOUT // 3))
+TASKS_POLL_INTERVAL = float(os.getenv('TASKS_POLL_INTERVAL', 1))
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_TOP_FUNCTIONS = int(os.getenv('PROFILING_TOP_FUNCTIONS', 30))
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 512))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI = os.getenv('COMPRESSION_BROTLI', 'True') == 'True'
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+
+SIMILAR_RECIPES_TOP_K = int(os.getenv('SIMILAR_RECIPES_TOP_K', 10))
+SIMILAR_RECIPES_TAG_WEIGHT = float(
+    os.getenv('SIMILAR_RECIPES_TAG_WEIGHT', 0.5)
+)
+SIMILAR_RECIPES_MAX_POSTINGS = int(
+    os.getenv('SIMILAR_RECIPES_MAX_POSTINGS', 500)
+)
+SIMILAR_RECIPES_BATCH_SIZE = int(
+    os.getenv('SIMILAR_RECIPES_BATCH_SIZE', 5000)
+)
+
+ESTIMATED_COUNT_THRESHOLD = int(
+    os.getenv('ESTIMATED_COUNT_THRESHOLD', 100000)
+)
+
+CHANGES_PAGE_SIZE = int(os.getenv('CHANGES_PAGE_SIZE', 500))
+CHANGES_MAX_PAGE_SIZE = int(os.getenv('CHANGES_MAX_PAGE_SIZE', 1000))
+CHANGES_SETTLE_SECONDS = int(os.getenv('CHANGES_SETTLE_SECONDS', 5))
+
+AUTHOR_CACHE_SIZE = int(os.getenv('AUTHOR_CACHE_SIZE', 10000))
+AUTHOR_CACHE_TTL = int(os.getenv('AUTHOR_CACHE_TTL', 300))
+
+EDGE_CACHE_TIMEOUT = int(os.getenv('EDGE_CACHE_TIMEOUT', 5))
+
+RECIPE_PURGE_BATCH_SIZE = int(os.getenv('RECIPE_PURGE_BATCH_SIZE', 1000))
+
+SQL_STATS_ENABLED = os.getenv('SQL_STATS_ENABLED', 'False') == 'True'
+SQL_STATS_MAX_ENTRIES = int(os.getenv('SQL_STATS_MAX_ENTRIES', 2000))
+SQL_STATS_SAMPLES = int(os.getenv('SQL_STATS_SAMPLES', 200))
+SQL_STATS_DUMP_INTERVAL = int(os.getenv('SQL_STATS_DUMP_INTERVAL', 60))
+SQL_STATS_LOG = os.getenv('SQL_STATS_LOG', os.path.join(BASE_DIR, 'logs', 'sql_stats.jsonl'))
+SQL_SLOW_MS = float(os.getenv('SQL_SLOW_MS', 200))
+SQL_SLOW_EXPLAIN = int(os.getenv('SQL_SLOW_EXPLAIN', 5))
@@ -10,7 +10,13 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# URLconf тянет за собой views, serializers и весь DRF. Без этого их
+# импортирует каждый воркер на первом запросе, а с preload_app загрузка
+# один раз в мастере делится между воркерами.
+get_resolver().url_patterns
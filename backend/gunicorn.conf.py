@@ -0,0 +1,99 @@
+"""Настройки gunicorn.
+
+Число воркеров и потоков считается от доступных контейнеру CPU,
+всё остальное переопределяется переменными окружения GUNICORN_*.
+Время загрузки приложения пишется в лог мастера и воркеров,
+предупреждение о локальном кеше — в лог мастера при старте.
+"""
+import os
+import time
+
+STARTED = time.perf_counter()
+
+
+def cpu_count():
+    """CPU с учётом квоты cgroup, а не всех ядер хоста."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+CPUS = cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'sync':
+    default_workers, default_threads = CPUS * 2 + 1, 1
+elif worker_class == 'gthread':
+    default_workers, default_threads = CPUS + 1, 4
+else:
+    default_workers, default_threads = CPUS, 1
+workers = int(os.getenv('GUNICORN_WORKERS', default_workers))
+threads = int(os.getenv('GUNICORN_THREADS', default_threads))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+if worker_class == 'gevent':
+    # gevent патчит socket и threading при старте воркера, а модули,
+    # загруженные мастером при preload, уже держат непропатченные.
+    preload_app = False
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    server.log.info(
+        'Мастер готов за %.3f с: %s воркеров %s x %s потоков, preload=%s',
+        time.perf_counter() - STARTED,
+        server.cfg.workers,
+        server.cfg.worker_class_str,
+        server.cfg.threads,
+        server.cfg.preload_app
+    )
+    # Проверка только читает настройки, приложения Django мастеру
+    # для неё загружать не нужно.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from api.checks import shared_cache_check
+
+    for warning in shared_cache_check():
+        server.log.warning('%s %s', warning.msg, warning.hint)
+
+
+def pre_fork(server, worker):
+    # Соединения мастера, открытые при preload, не должны попасть
+    # в воркеры: один сокет на несколько процессов ломает протокол.
+    if server.cfg.preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_fork(server, worker):
+    worker.started = time.perf_counter()
+    if server.cfg.worker_class_str == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+
+        patch_psycopg()
+
+
+def post_worker_init(worker):
+    worker.log.info(
+        'Воркер %s загрузил приложение за %.3f с',
+        worker.pid,
+        time.perf_counter() - worker.started
+    )
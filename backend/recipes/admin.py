@@ -2,6 +2,8 @@ from django.contrib import admin
 
 from .models import (CountIngredients, FavoriteRecipes, Ingredients, Recipes,
                      ShoppingCart, Tags)
+from .paginator import EstimatedCountPaginator
+from .purge import soft_delete
 
 
 @admin.register(Tags)
@@ -26,6 +28,8 @@ class IngredientsAdmin(admin.ModelAdmin):
         'measurement_unit')
     list_editable = ('name',)
     search_fields = ('name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Recipes)
@@ -40,32 +44,52 @@ class RecipesAdmin(admin.ModelAdmin):
 
     list_editable = (
         'name',
-        'cooking_time',
-        'author')
-    list_filter = (
-        'name',
-        'author',
-        'tags')
+        'cooking_time')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username')
+    raw_id_fields = ('author',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def delete_model(self, request, obj):
+        soft_delete(obj)
+
+    def delete_queryset(self, request, queryset):
+        for recipe in queryset:
+            soft_delete(recipe)
 
     def favorite(self, obj):
-        return obj.favorite_recipes.count()
+        return obj.favorites_count
     favorite.short_description = 'В избранном'
+    favorite.admin_order_field = 'favorites_count'
 
 
 @admin.register(CountIngredients)
 class CountIngredientsAdmin(admin.ModelAdmin):
     list_display = ('pk', 'recipe', 'ingredients', 'amount')
-    list_editable = ('recipe', 'ingredients', 'amount')
+    list_editable = ('amount',)
+    list_select_related = ('recipe', 'ingredients')
+    raw_id_fields = ('recipe',)
+    autocomplete_fields = ('ingredients',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(FavoriteRecipes)
 class FavoriteRecipesAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
-    list_editable = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
-    list_editable = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
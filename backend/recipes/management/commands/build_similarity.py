@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.similarity import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие рецепты для всех рецептов'
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=settings.SIMILAR_RECIPES_TOP_K
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_all(options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов: {count}, '
+            f'{time.perf_counter() - start:.2f} с'
+        ))
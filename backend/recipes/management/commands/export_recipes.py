@@ -0,0 +1,68 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from recipes.models import CountIngredients, Recipes
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов в NDJSON'
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл для записи или '-'")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            self.export(sys.stdout, options['chunk_size'])
+            return
+        with open(options['path'], 'w', encoding='utf-8') as ndjson_file:
+            count = self.export(ndjson_file, options['chunk_size'])
+        self.stdout.write(f'Выгружено рецептов: {count}')
+
+    def export(self, ndjson_file, chunk_size):
+        queryset = Recipes.objects.order_by('pk').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'count_in_recipe',
+                queryset=CountIngredients.objects.select_related(
+                    'ingredients'
+                )
+            )
+        )
+        count = 0
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                return count
+            for recipe in chunk:
+                ndjson_file.write(json.dumps(
+                    self.serialize(recipe),
+                    ensure_ascii=False
+                ) + '\n')
+            count += len(chunk)
+            last_pk = chunk[-1].pk
+
+    def serialize(self, recipe):
+        return {
+            'author': recipe.author.email,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'image': recipe.image.name,
+            'pub_date': recipe.pub_date.isoformat(),
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': amount.ingredients.name,
+                    'measurement_unit': amount.ingredients.measurement_unit,
+                    'amount': amount.amount,
+                }
+                for amount in recipe.count_in_recipe.all()
+            ],
+        }
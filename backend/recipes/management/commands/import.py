@@ -9,6 +9,7 @@ FILENAME = 'ingredients.csv'
 
 class Command(BaseCommand):
     help = 'Load csv'
+    requires_system_checks = False
 
     def handle(self, *args, **options):
         with open(MYPATH + '/' + FILENAME, encoding='utf-8') as csv_file:
@@ -0,0 +1,128 @@
+import json
+import sys
+from itertools import islice
+
+from api.cache import bump_versions
+from api.signals import FEED
+from api.snapshots import RECIPE_INDEX, bump_snapshots
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from recipes.models import CountIngredients, Ingredients, Recipes, Tags
+from recipes.tasks import rebuild_similar
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Загрузка рецептов из NDJSON пачками'
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл для чтения или '-'")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.ingredients = {
+            (name, unit): pk
+            for pk, name, unit in Ingredients.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        }
+        self.tags = dict(Tags.objects.values_list('slug', 'pk'))
+        self.imported = self.skipped = 0
+        if options['path'] == '-':
+            self.load(sys.stdin, options['chunk_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as ndjson_file:
+                self.load(ndjson_file, options['chunk_size'])
+        # Сигналы при загрузке не срабатывают, поэтому версии кешей
+        # сбрасываются один раз на весь файл, а похожие рецепты
+        # пересчитывает обработчик очереди, не задерживая загрузку.
+        if self.imported:
+            rebuild_similar.delay()
+        bump_versions(FEED)
+        bump_snapshots(RECIPE_INDEX)
+        self.stdout.write(
+            f'Загружено рецептов: {self.imported}, '
+            f'пропущено: {self.skipped}'
+        )
+
+    def load(self, ndjson_file, chunk_size):
+        lines = (line for line in ndjson_file if line.strip())
+        while True:
+            chunk = [json.loads(line) for line in islice(lines, chunk_size)]
+            if not chunk:
+                return
+            self.load_chunk(chunk)
+
+    def resolve(self, item, authors):
+        try:
+            return (
+                authors[item['author']],
+                [self.tags[slug] for slug in item['tags']],
+                [
+                    (self.ingredients[
+                        ingredient['name'],
+                        ingredient['measurement_unit']
+                    ], ingredient['amount'])
+                    for ingredient in item['ingredients']
+                ]
+            )
+        except KeyError as error:
+            self.stderr.write(f'{item["name"]}: не найдено {error}')
+            return None
+
+    @transaction.atomic
+    def load_chunk(self, chunk):
+        authors = dict(User.objects.filter(
+            email__in={item['author'] for item in chunk}
+        ).values_list('email', 'pk'))
+        recipes = []
+        relations = []
+        for item in chunk:
+            resolved = self.resolve(item, authors)
+            if resolved is None:
+                self.skipped += 1
+                continue
+            author_id, tags, ingredients = resolved
+            recipes.append(Recipes(
+                author_id=author_id,
+                name=item['name'],
+                text=item['text'],
+                cooking_time=item['cooking_time'],
+                image=item.get('image', ''),
+            ))
+            relations.append((item.get('pub_date'), tags, ingredients))
+        Recipes.objects.bulk_create(recipes)
+        if not connection.features.can_return_ids_from_bulk_insert:
+            # SQLite не возвращает id из bulk_create, но до конца
+            # транзакции писать в таблицу может только она, а id растут,
+            # так что последние len(recipes) id — только что вставленные.
+            ids = list(Recipes.all_objects.order_by('-pk').values_list(
+                'pk', flat=True
+            )[:len(recipes)])
+            for recipe, pk in zip(recipes, reversed(ids)):
+                recipe.pk = pk
+        through = Recipes.tags.through
+        tag_links = []
+        amounts = []
+        dated = []
+        for recipe, (pub_date, tags, ingredients) in zip(recipes, relations):
+            tag_links.extend(
+                through(recipes_id=recipe.pk, tags_id=tag) for tag in tags
+            )
+            amounts.extend(
+                CountIngredients(
+                    recipe_id=recipe.pk,
+                    ingredients_id=ingredient,
+                    amount=amount
+                )
+                for ingredient, amount in ingredients
+            )
+            if pub_date:
+                recipe.pub_date = parse_datetime(pub_date)
+                dated.append(recipe)
+        through.objects.bulk_create(tag_links)
+        CountIngredients.objects.bulk_create(amounts)
+        Recipes.objects.bulk_update(dated, ['pub_date'])
+        self.imported += len(recipes)
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.models import Recipes
+from recipes.purge import purge
+
+
+class Command(BaseCommand):
+    help = (
+        'Физически удаляет все помеченные на удаление рецепты, '
+        'например если задачи очереди были потеряны'
+    )
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECIPE_PURGE_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ids = list(Recipes.all_objects.filter(
+            deleted_at__isnull=False
+        ).values_list('pk', flat=True))
+        for recipe_id in ids:
+            purge(recipe_id, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов: {len(ids)}, '
+            f'{time.perf_counter() - start:.2f} с'
+        ))
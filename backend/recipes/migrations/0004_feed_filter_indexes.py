@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-19 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_similar_recipe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='countingredients',
+            index=models.Index(fields=['recipe', 'ingredients'], name='count_recipe_ingredient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(fields=['cooking_time', '-id'], name='recipe_cooking_time_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-19 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_changes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipes',
+            name='recipe_pub_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipes',
+            name='recipe_cooking_time_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipes',
+            name='recipe_updated_at_idx',
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата удаления'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['cooking_time', '-id'], name='recipe_cooking_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['updated_at', 'id'], name='recipe_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-19 20:31
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_favorites(apps, schema_editor):
+    Recipes = apps.get_model('recipes', 'Recipes')
+    FavoriteRecipes = apps.get_model('recipes', 'FavoriteRecipes')
+    Recipes.objects.update(favorites_count=Coalesce(
+        Subquery(
+            FavoriteRecipes.objects.filter(
+                recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                count=Count('pk')
+            ).values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(count_favorites, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipes',
+            index=models.Index(condition=models.Q(deleted_at__isnull=True), fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+    ]
@@ -1,8 +1,12 @@
 from colorfield.fields import ColorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from users.models import User
 
+ACTIVE = Q(deleted_at__isnull=True)
+
 
 class Tags(models.Model):
     name = models.CharField(
@@ -38,6 +42,29 @@ class Ingredients(models.Model):
         return f'{self.name} - {self.measurement_unit}'
 
 
+class RecipesQuerySet(models.QuerySet):
+    def recount_favorites(self):
+        """Пересчитывает favorites_count по таблице избранного."""
+        return self.update(favorites_count=Coalesce(
+            Subquery(
+                FavoriteRecipes.objects.filter(
+                    recipe=OuterRef('pk')
+                ).order_by().values('recipe').annotate(
+                    count=Count('pk')
+                ).values('count'),
+                output_field=IntegerField()
+            ),
+            0
+        ))
+
+
+class ActiveRecipesManager(models.Manager.from_queryset(RecipesQuerySet)):
+    """Рецепты без помеченных на удаление."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(ACTIVE)
+
+
 class Recipes(models.Model):
     author = models.ForeignKey(
         User,
@@ -73,11 +100,51 @@ class Recipes(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    deleted_at = models.DateTimeField(
+        'Дата удаления',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+
+    objects = ActiveRecipesManager()
+    all_objects = models.Manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx',
+                condition=ACTIVE
+            ),
+            models.Index(
+                fields=['cooking_time', '-id'],
+                name='recipe_cooking_time_idx',
+                condition=ACTIVE
+            ),
+            models.Index(
+                fields=['updated_at', 'id'],
+                name='recipe_updated_at_idx',
+                condition=ACTIVE
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx',
+                condition=ACTIVE
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -110,6 +177,12 @@ class CountIngredients(models.Model):
     class Meta:
         verbose_name = 'Количество'
         verbose_name_plural = 'Количество'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredients'],
+                name='count_recipe_ingredient_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'{self.ingredients} - {self.amount}'
@@ -168,3 +241,53 @@ class ShoppingCart(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user} add to {self.recipe}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Близость')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.recipe} ~ {self.similar}'
+
+
+class RecipeTombstone(models.Model):
+    recipe_id = models.IntegerField('id рецепта')
+    deleted_at = models.DateTimeField(
+        'Дата удаления',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый рецепт'
+        verbose_name_plural = 'Удалённые рецепты'
+        indexes = [
+            models.Index(
+                fields=['deleted_at', 'recipe_id'],
+                name='tombstone_deleted_at_idx'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id} deleted at {self.deleted_at}'
@@ -0,0 +1,121 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+
+def table_estimate(model, using):
+    """Число строк таблицы по статистике планировщика PostgreSQL."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+def explain_estimate(queryset):
+    """Оценка числа строк запроса из EXPLAIN без его выполнения."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def where_sql(queryset):
+    query = queryset.query
+    return query.get_compiler(queryset.db).compile(query.where)
+
+
+def filtered(queryset):
+    """Есть ли у выборки условия сверх фильтра менеджера по умолчанию."""
+    default = queryset.model._default_manager.all()
+    return where_sql(queryset) != where_sql(default)
+
+
+def estimate_count(queryset):
+    """Число строк и признак того, что оно приблизительное.
+
+    На PostgreSQL, если таблица больше ESTIMATED_COUNT_THRESHOLD строк,
+    используется pg_class.reltuples для всей таблицы или оценка EXPLAIN
+    для отфильтрованной выборки. Фильтр менеджера по умолчанию, например
+    скрытие мягко удалённых рецептов, выборку отфильтрованной не делает:
+    такие строки вскоре удаляются, и reltuples завышает count на них.
+    Если оценка не больше порога, а также на других СУБД и для списков
+    считается точно.
+    """
+    if not hasattr(queryset, 'query'):
+        return len(queryset), False
+    threshold = settings.ESTIMATED_COUNT_THRESHOLD
+    if connections[queryset.db].vendor == 'postgresql':
+        estimate = table_estimate(queryset.model, queryset.db)
+        try:
+            if estimate > threshold and filtered(queryset):
+                estimate = explain_estimate(queryset)
+        except EmptyResultSet:
+            return 0, False
+        if estimate > threshold:
+            return estimate, True
+    return queryset.count(), False
+
+
+class EstimatedPage(Page):
+    more = None
+
+    def has_next(self):
+        if self.more is None:
+            return super().has_next()
+        return self.more
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без COUNT(*) по большим выборкам.
+
+    При приблизительном count номер страницы не ограничивается сверху,
+    а наличие следующей страницы проверяется лишней строкой в выборке:
+    оценка может оказаться меньше настоящего числа строк.
+    """
+
+    @cached_property
+    def _count(self):
+        return estimate_count(self.object_list)
+
+    @property
+    def count(self):
+        return self._count[0]
+
+    @property
+    def estimated(self):
+        return self._count[1]
+
+    def validate_number(self, number):
+        if not self.estimated:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        if not self.estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.more = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import (CountIngredients, FavoriteRecipes, Recipes,
+                     RecipeTombstone, ShoppingCart, SimilarRecipe)
+from .tasks import purge_recipe
+
+DEPENDENTS = (
+    (FavoriteRecipes, 'recipe_id'),
+    (ShoppingCart, 'recipe_id'),
+    (SimilarRecipe, 'recipe_id'),
+    (SimilarRecipe, 'similar_id'),
+    (Recipes.tags.through, 'recipes_id'),
+    (CountIngredients, 'recipe_id'),
+)
+
+
+def soft_delete(recipe):
+    """Скрывает рецепт сразу и ставит в очередь его физическое удаление.
+
+    Надгробие для ленты изменений пишется здесь же, удаление строки
+    позже уже не создаёт второе.
+    """
+    with transaction.atomic():
+        recipe.deleted_at = timezone.now()
+        recipe.save(update_fields=('deleted_at', 'updated_at'))
+        RecipeTombstone.objects.create(recipe_id=recipe.pk)
+        transaction.on_commit(lambda: purge_recipe.delay(recipe.pk))
+
+
+def delete_batches(queryset, batch_size):
+    """Удаляет строки пачками по batch_size, каждая в своей транзакции.
+
+    Пачка удаляется одним DELETE на SQL, а не через QuerySet.delete():
+    тот выбирал бы строки заново и слал post_delete на каждую, а
+    обработчик избранного пересчитывал бы favorites_count рецепта,
+    который всё равно удаляется. На зависимые строки никто не ссылается,
+    версии кешей сброшены ещё в soft_delete.
+    """
+    meta = queryset.model._meta
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(meta.db_table)
+    column = connection.ops.quote_name(meta.pk.column)
+    deleted = 0
+    while True:
+        with transaction.atomic(using=queryset.db):
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE {column} IN ({placeholders})',
+                    ids
+                )
+        deleted += len(ids)
+
+
+def purge(recipe_id, batch_size=None):
+    """Физически удаляет помеченный рецепт, зависимые строки и картинку.
+
+    Избранное, списки покупок и прочие зависимые строки удаляются
+    короткими транзакциями по RECIPE_PURGE_BATCH_SIZE строк, файл
+    изображения — после удаления самого рецепта, если на него больше
+    никто не ссылается. Возвращает False, если рецепт не помечен.
+    """
+    batch_size = batch_size or settings.RECIPE_PURGE_BATCH_SIZE
+    recipe = Recipes.all_objects.filter(
+        pk=recipe_id, deleted_at__isnull=False
+    ).first()
+    if recipe is None:
+        return False
+    for model, field in DEPENDENTS:
+        delete_batches(model.objects.filter(**{field: recipe_id}), batch_size)
+    image = recipe.image.name
+    with transaction.atomic():
+        recipe.delete()
+        if image and not Recipes.all_objects.filter(image=image).exists():
+            transaction.on_commit(lambda: default_storage.delete(image))
+    return True
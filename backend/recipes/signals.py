@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import CountIngredients, FavoriteRecipes, Recipes, RecipeTombstone
+from .tasks import update_similar
+
+
+@receiver(post_save, sender=Recipes)
+def recipe_saved(sender, instance, **kwargs):
+    """Создание и изменение рецепта, в том числе через админку,
+    заканчиваются сохранением самого рецепта, поэтому пересчёт
+    похожих ставится после коммита, когда теги и ингредиенты
+    уже записаны. Повторные сохранения в одной правке дают одну задачу,
+    скрытый рецепт не пересчитывается: его соседей удалит purge."""
+    if instance.deleted_at is not None:
+        return
+    transaction.on_commit(lambda: update_similar.delay(instance.pk))
+
+
+@receiver(post_delete, sender=Recipes)
+def recipe_deleted(sender, instance, **kwargs):
+    """У мягко удалённых рецептов надгробие уже создано в soft_delete."""
+    if instance.deleted_at is None:
+        RecipeTombstone.objects.create(recipe_id=instance.pk)
+
+
+@receiver(post_save, sender=CountIngredients)
+@receiver(post_delete, sender=CountIngredients)
+def count_ingredients_changed(sender, instance, **kwargs):
+    """Правка строк ингредиентов отдельно от рецепта тоже считается
+    его изменением для ленты изменений."""
+    Recipes.objects.filter(pk=instance.recipe_id).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=FavoriteRecipes)
+def favorite_added(sender, instance, created, **kwargs):
+    """favorites_count для строк по одной: из API, из админки и при
+    каскадном удалении пользователя. Пакетные операции API пересчитывают
+    счётчик сами."""
+    if created:
+        Recipes.all_objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+
+
+@receiver(post_delete, sender=FavoriteRecipes)
+def favorite_removed(sender, instance, **kwargs):
+    Recipes.all_objects.filter(pk=instance.recipe_id).update(
+        favorites_count=F('favorites_count') - 1
+    )
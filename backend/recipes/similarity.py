@@ -0,0 +1,238 @@
+import heapq
+import math
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import CountIngredients, Recipes, SimilarRecipe
+
+TagsThrough = Recipes.tags.through
+
+
+def load_features(ingredient_rows, tag_rows):
+    """Множества признаков рецептов: ('i', id) и ('t', id)."""
+    features = defaultdict(set)
+    for recipe_id, ingredient_id in ingredient_rows:
+        features[recipe_id].add(('i', ingredient_id))
+    for recipe_id, tag_id in tag_rows:
+        features[recipe_id].add(('t', tag_id))
+    return features
+
+
+def build_vectors(features, frequency, total):
+    """Нормированные разреженные TF-IDF векторы в виде словарей."""
+    tag_weight = settings.SIMILAR_RECIPES_TAG_WEIGHT
+    vectors = {}
+    for recipe_id, recipe_features in features.items():
+        vector = {
+            feature: (
+                math.log((1 + total) / (1 + frequency[feature])) + 1
+            ) * (tag_weight if feature[0] == 't' else 1)
+            for feature in recipe_features
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        vectors[recipe_id] = {
+            feature: weight / norm for feature, weight in vector.items()
+        }
+    return vectors
+
+
+def invert(vectors):
+    """Списки рецептов по признакам, по убыванию веса признака."""
+    index = defaultdict(list)
+    for recipe_id, vector in vectors.items():
+        for feature, weight in vector.items():
+            index[feature].append((recipe_id, weight))
+    for postings in index.values():
+        postings.sort(key=lambda posting: -posting[1])
+    return index
+
+
+def similarities(recipe_id, vectors, index, limit=None):
+    """Косинусная близость рецепта с кандидатами.
+
+    Кандидаты — рецепты из списков инвертированного индекса по общим
+    ингредиентам. Ингредиенты, которые есть больше чем в limit рецептах
+    (соль, сахар), кандидатов не порождают, иначе каждый рецепт
+    сравнивался бы почти со всеми; если других нет, берутся limit
+    рецептов с наибольшим весом самого редкого. Частые ингредиенты и
+    теги лишь добавляют вес уже найденным кандидатам.
+    """
+    limit = limit or settings.SIMILAR_RECIPES_MAX_POSTINGS
+    vector = vectors[recipe_id]
+    ingredients = [feature for feature in vector if feature[0] == 'i']
+    rare = [feature for feature in ingredients if len(index[feature]) <= limit]
+    if not rare and ingredients:
+        rare = [min(ingredients, key=lambda feature: len(index[feature]))]
+    scores = defaultdict(float)
+    for feature in rare:
+        for other_id, other_weight in index[feature][:limit]:
+            scores[other_id] += vector[feature] * other_weight
+    scores.pop(recipe_id, None)
+    for feature, weight in vector.items():
+        if feature not in rare:
+            for other_id in scores:
+                scores[other_id] += weight * vectors[other_id].get(feature, 0)
+    return scores
+
+
+def cosine(vector, others, vectors):
+    """Близость с рецептами others, у которых есть общие ингредиенты."""
+    scores = {}
+    for other_id in others:
+        other = vectors[other_id]
+        common = [feature for feature in vector if feature in other]
+        if any(feature[0] == 'i' for feature in common):
+            scores[other_id] = sum(
+                vector[feature] * other[feature] for feature in common
+            )
+    return scores
+
+
+def top(scores, top_k):
+    return heapq.nlargest(
+        top_k, scores.items(), key=lambda item: (item[1], -item[0])
+    )
+
+
+def rebuild_all(top_k=None):
+    """Полный пересчёт похожих рецептов; возвращает число рецептов."""
+    top_k = top_k or settings.SIMILAR_RECIPES_TOP_K
+    features = load_features(
+        CountIngredients.objects.filter(
+            recipe__deleted_at__isnull=True
+        ).values_list('recipe_id', 'ingredients_id'),
+        TagsThrough.objects.filter(
+            recipes__deleted_at__isnull=True
+        ).values_list('recipes_id', 'tags_id')
+    )
+    frequency = defaultdict(int)
+    for recipe_features in features.values():
+        for feature in recipe_features:
+            frequency[feature] += 1
+    vectors = build_vectors(features, frequency, Recipes.objects.count())
+    index = invert(vectors)
+    rows = (
+        SimilarRecipe(recipe_id=recipe_id, similar_id=other_id, score=score)
+        for recipe_id in vectors
+        for other_id, score in top(
+            similarities(recipe_id, vectors, index), top_k
+        )
+    )
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        # bulk_create делает из генератора список, поэтому строки
+        # собираются и вставляются пачками, а не все пары сразу.
+        # Размер INSERT внутри пачки ограничивает сам бэкенд.
+        while True:
+            batch = list(islice(rows, settings.SIMILAR_RECIPES_BATCH_SIZE))
+            if not batch:
+                break
+            SimilarRecipe.objects.bulk_create(batch)
+    return len(vectors)
+
+
+def update_recipe(recipe_id, top_k=None):
+    """Пересчёт соседей одного рецепта после его изменения.
+
+    Загружаются рецепты с общими редкими ингредиентами, как в
+    similarities, и те, у кого рецепт уже в списке; частоты признаков
+    берутся агрегатами по всей таблице. В списках, где
+    рецепт уже есть, обновляется близость; в списки своих соседей он
+    вставляется, если проходит в их top-K. Остальные списки
+    уточняются при следующем rebuild_all. Удалённый рецепт
+    убирается из всех списков.
+    """
+    top_k = top_k or settings.SIMILAR_RECIPES_TOP_K
+    limit = settings.SIMILAR_RECIPES_MAX_POSTINGS
+    active = CountIngredients.objects.filter(recipe__deleted_at__isnull=True)
+    counts = dict(active.filter(
+        ingredients_id__in=CountIngredients.objects.filter(
+            recipe_id=recipe_id
+        ).values('ingredients_id')
+    ).values_list('ingredients_id').annotate(
+        Count('recipe_id', distinct=True)
+    ))
+    rare = [pk for pk, count in counts.items() if count <= limit]
+    if not rare and counts:
+        # Как в similarities, но без весов: самые новые рецепты.
+        others = active.filter(
+            ingredients_id=min(counts, key=counts.get)
+        ).order_by('-recipe_id').values('recipe_id')[:limit]
+    else:
+        others = active.filter(ingredients_id__in=rare).values('recipe_id')
+    loaded = (
+        Q(recipe_id=recipe_id)
+        | Q(recipe_id__in=others)
+        | Q(recipe_id__in=SimilarRecipe.objects.filter(
+            similar_id=recipe_id
+        ).values('recipe_id'))
+    )
+    features = load_features(
+        active.filter(loaded).values_list('recipe_id', 'ingredients_id'),
+        TagsThrough.objects.filter(
+            recipes_id__in=active.filter(loaded).values('recipe_id'),
+        ).values_list('recipes_id', 'tags_id')
+    )
+    ingredient_ids = {
+        pk for recipe_features in features.values()
+        for kind, pk in recipe_features if kind == 'i'
+    }
+    frequency = {
+        ('i', pk): count for pk, count in CountIngredients.objects.filter(
+            ingredients_id__in=ingredient_ids,
+            recipe__deleted_at__isnull=True
+        ).values_list('ingredients_id').annotate(
+            Count('recipe_id', distinct=True)
+        )
+    }
+    frequency.update(
+        (('t', pk), count) for pk, count in TagsThrough.objects.filter(
+            recipes__deleted_at__isnull=True
+        ).values_list('tags_id').annotate(Count('recipes_id', distinct=True))
+    )
+    vectors = build_vectors(features, frequency, Recipes.objects.count())
+    scores = {}
+    if recipe_id in vectors:
+        scores = cosine(
+            vectors[recipe_id], set(vectors) - {recipe_id}, vectors
+        )
+    neighbours = top(scores, top_k)
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=other_id,
+                          score=score)
+            for other_id, score in neighbours
+        )
+        listed = list(SimilarRecipe.objects.filter(similar_id=recipe_id))
+        SimilarRecipe.objects.filter(pk__in=[
+            row.pk for row in listed if row.recipe_id not in scores
+        ]).delete()
+        rescored = [row for row in listed if row.recipe_id in scores]
+        for row in rescored:
+            row.score = scores[row.recipe_id]
+        SimilarRecipe.objects.bulk_update(rescored, ['score'])
+        listed_ids = {row.recipe_id for row in listed}
+        for other_id, score in neighbours:
+            if other_id not in listed_ids:
+                _insert_neighbour(other_id, recipe_id, score, top_k)
+
+
+def _insert_neighbour(recipe_id, similar_id, score, top_k):
+    current = list(SimilarRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).order_by('-score').values_list('pk', 'score'))
+    if len(current) >= top_k and current[top_k - 1][1] >= score:
+        return
+    SimilarRecipe.objects.create(
+        recipe_id=recipe_id,
+        similar_id=similar_id,
+        score=score
+    )
+    SimilarRecipe.objects.filter(
+        pk__in=[pk for pk, _ in current[top_k - 1:]]
+    ).delete()
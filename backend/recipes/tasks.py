@@ -0,0 +1,24 @@
+from tasks.queue import task
+
+
+@task(unique=True)
+def update_similar(recipe_id):
+    # similarity нужен только обработчику очереди, а tasks импортируется
+    # из signals при старте каждого процесса.
+    from .similarity import update_recipe
+
+    update_recipe(recipe_id)
+
+
+@task(unique=True)
+def rebuild_similar():
+    from .similarity import rebuild_all
+
+    rebuild_all()
+
+
+@task()
+def purge_recipe(recipe_id):
+    from .purge import purge
+
+    purge(recipe_id)
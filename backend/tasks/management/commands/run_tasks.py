@@ -0,0 +1,91 @@
+import logging
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, connections
+from tasks.queue import claim, execute
+
+logger = logging.getLogger('tasks')
+
+POOLS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди фоновых задач'
+    requires_system_checks = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.TASKS_WORKERS
+        )
+        parser.add_argument(
+            '--pool', choices=POOLS.keys(), default='thread'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=settings.TASKS_POLL_INTERVAL
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выйти, когда очередь опустеет'
+        )
+
+    def handle(self, *args, **options):
+        """Задачи забираются по числу свободных мест в пуле и
+        добавляются по мере завершения, а не пачкой: одна долгая задача
+        не держит остальные места пустыми."""
+        workers = options['workers']
+        forks = options['pool'] == 'process'
+        # SQLite не пускает второго писателя: claim() рядом с работающими
+        # задачами падает с database is locked, поэтому там ждём весь пул.
+        serial = connection.vendor == 'sqlite'
+        connections.close_all()
+        running = set()
+        with POOLS[options['pool']](max_workers=workers) as pool:
+            while True:
+                ids = []
+                if not (serial and running):
+                    try:
+                        ids = claim(workers - len(running))
+                    except DatabaseError:
+                        logger.exception('Не удалось забрать задачи')
+                if forks:
+                    # Дочерний процесс не должен унаследовать сокет
+                    # соединения, открытого claim(): закрывая его, он
+                    # завершил бы сессию родителя.
+                    connections.close_all()
+                running.update(pool.submit(execute, pk) for pk in ids)
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                done, running = wait(
+                    running,
+                    timeout=(
+                        None if serial or len(running) == workers
+                        else options['sleep']
+                    ),
+                    return_when=FIRST_COMPLETED
+                )
+                if done:
+                    results = [self.result(future) for future in done]
+                    self.stdout.write(
+                        f'Выполнено: {results.count(True)}, '
+                        f'с ошибкой: {results.count(False)}'
+                    )
+
+    def result(self, future):
+        """Ошибка вне задачи, например базы, не останавливает цикл:
+        остальные задачи пула ещё выполняются."""
+        try:
+            return future.result()
+        except Exception:
+            logger.exception('Обработчик задачи упал')
+            return False
@@ -0,0 +1,137 @@
+import json
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (DatabaseError, close_old_connections, connections,
+                       transaction)
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger('tasks')
+
+
+def task(max_attempts=None, unique=False):
+    """Декоратор: добавляет функции метод delay для постановки в очередь.
+
+    Аргументы задачи должны сериализоваться в JSON. В режиме TASKS_EAGER
+    функция выполняется сразу, в том же потоке. При unique=True задача
+    не ставится, если такая же, с теми же аргументами, ещё ждёт в
+    очереди; одновременные вызовы всё же могут поставить две.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        def delay(*args, **kwargs):
+            if settings.TASKS_EAGER:
+                func(*args, **kwargs)
+                return None
+            payload = json.dumps({'args': args, 'kwargs': kwargs})
+            if unique:
+                pending = Task.objects.filter(
+                    name=name, payload=payload, status=Task.PENDING
+                ).first()
+                if pending is not None:
+                    return pending
+            return Task.objects.create(
+                name=name,
+                payload=payload,
+                max_attempts=max_attempts or settings.TASKS_MAX_ATTEMPTS
+            )
+
+        func.delay = delay
+        func.task_name = name
+        return func
+    return decorator
+
+
+def claim(limit):
+    """Забирает в работу до limit готовых задач и возвращает их id.
+
+    Задачи, чей locked_at старше TASKS_TIMEOUT секунд, считаются
+    брошенными и забираются снова. Пока задача выполняется, heartbeat
+    обновляет locked_at, так что повторно забирается только задача
+    упавшего обработчика. Доставка всё равно «хотя бы один раз»:
+    задачи должны быть идемпотентны.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASKS_TIMEOUT)
+    with transaction.atomic():
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True).filter(
+                Q(status=Task.PENDING, run_at__lte=now)
+                | Q(status=Task.RUNNING, locked_at__lt=stale)
+            ).order_by('run_at').values_list('pk', flat=True)[:limit]
+        )
+        Task.objects.filter(pk__in=ids).update(
+            status=Task.RUNNING,
+            locked_at=now
+        )
+    return ids
+
+
+@contextmanager
+def heartbeat(task_id):
+    """Раз в TASKS_HEARTBEAT секунд продлевает locked_at задачи."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(settings.TASKS_HEARTBEAT):
+            try:
+                Task.objects.filter(
+                    pk=task_id, status=Task.RUNNING
+                ).update(locked_at=timezone.now())
+            except DatabaseError:
+                logger.exception('Не удалось продлить задачу %s', task_id)
+        connections.close_all()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def execute(task_id):
+    """Выполняет задачу; успешные удаляются, неудачные повторяются.
+
+    Возвращает None, если задачи уже нет: её выполнил и удалил другой
+    обработчик.
+    """
+    close_old_connections()
+    job = Task.objects.filter(pk=task_id).first()
+    if job is None:
+        return None
+    try:
+        payload = json.loads(job.payload)
+        with heartbeat(task_id):
+            import_string(job.name)(*payload['args'], **payload['kwargs'])
+    except Exception:
+        job.attempts += 1
+        job.last_error = traceback.format_exc()
+        job.locked_at = None
+        if job.attempts < job.max_attempts:
+            job.status = Task.PENDING
+            job.run_at = timezone.now() + timedelta(
+                seconds=settings.TASKS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = Task.FAILED
+        Task.objects.filter(pk=task_id).update(
+            attempts=job.attempts,
+            last_error=job.last_error,
+            locked_at=job.locked_at,
+            status=job.status,
+            run_at=job.run_at
+        )
+        return False
+    job.delete()
+    return True
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from recipes.paginator import EstimatedCountPaginator
 
 from .models import Subscriptions, User
 
@@ -12,17 +13,20 @@ class UserAdmin(UserAdmin):
         'email',
         'first_name',
         'last_name',
-        'password',
         'admin'
     )
-    list_editable = ('password', )
     search_fields = ('username', 'email')
-    list_filter = ('username', 'email')
+    list_filter = ('admin', 'bloked', 'is_active')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Subscriptions)
 class SubscriptionsAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'author')
-    list_editable = ('user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-19 19:25
+
+from django.db import migrations
+
+SEARCH_INDEXES = {
+    'users_user_username_upper_like': 'username',
+    'users_user_email_upper_like': 'email',
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in SEARCH_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON users_user '
+            f'(UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY не блокирует запись в users_user, но не работает
+    # внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'verbose_name': ('Пользователь',), 'verbose_name_plural': 'Пользователи'},
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
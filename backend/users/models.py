@@ -32,7 +32,6 @@ class User(AbstractUser):
     REQUIRED_FIELDS = ['username']
 
     class Meta:
-        ordering = ['-id']
         verbose_name = 'Пользователь',
         verbose_name_plural = 'Пользователи'
 